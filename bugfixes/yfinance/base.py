@@ -40,6 +40,17 @@ from . import utils
 
 from . import shared
 
+# BUGFIX - START
+# use the shared http transport of the StockAnalyzer (keep-alive, gzip, timeouts), if it is available
+try:
+    from utils.http_session import getTransport as _getTransport
+
+    def _http_get(url, **kwargs):
+        return _getTransport().get(url, **kwargs)
+except ImportError:
+    _http_get = _requests.get
+# BUGFIX - ENDE
+
 
 class TickerBase():
     def __init__(self, ticker):
@@ -147,7 +158,7 @@ class TickerBase():
 
         # Getting data from json
         url = "{}/v8/finance/chart/{}".format(self._base_url, self.ticker)
-        data = _requests.get(url=url, params=params, proxies=proxy)
+        data = _http_get(url=url, params=params, proxies=proxy)
         if "Will be right back" in data.text:
             raise RuntimeError("*** YAHOO! FINANCE IS CURRENTLY DOWN! ***\n"
                                "Our engineers are working quickly to resolve "
@@ -509,7 +520,7 @@ class TickerBase():
         url = 'https://markets.businessinsider.com/ajax/' \
               'SearchController_Suggest?max_results=25&query=%s' \
             % urlencode(q)
-        data = _requests.get(url=url, proxies=proxy).text
+        data = _http_get(url=url, proxies=proxy).text
 
         search_str = '"{}|'.format(ticker)
         if search_str not in data:
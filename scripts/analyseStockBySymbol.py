@@ -1,14 +1,29 @@
 import sys, os
+import io
 import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 
 import json
 
+# the analysis modules (pandas, yfinance, ...) are imported, when a stock is analysed,
+# so "--help" and the start of the worker processes are fast
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from classes.Stock import Stock
-from classes.StockAnalyzer import StockAnalyzer
 
 
-def analyseStockBySymbol(symbol, growthRateEstimated=None, margin_of_safety=None, discountRate=None):
+# columns of the summary table for the batch mode
+SUMMARY_COLUMNS = ['Graham number', 'DCF value', 'DCF P5', 'DCF P50', 'DCF P95', 'Piotroski F Score',
+    'Net margin', 'Return on equity', 'Return on assets', 'FCF by sales', 'error']
+
+# columns of the summary table with the latest value of a financial ratio (see classes/Ratios.py)
+SUMMARY_RATIOS = {'Net margin': 'netMargin', 'Return on equity': 'returnOnEquity', 'Return on assets': 'returnOnAssets', 'FCF by sales': 'freeCashFlowBySales'}
+
+
+def analyseStockBySymbol(symbol, growthRateEstimated=None, margin_of_safety=None, discountRate=None, monteCarloPaths=0):
+    from classes.Stock import Stock
+    from classes.StockAnalyzer import StockAnalyzer
+    from classes import Ratios
+
     # creating a stock object
     stock = Stock(stockSymbol=symbol, growthRateEstimate=growthRateEstimated, margin_of_safety=margin_of_safety, discountRate=discountRate)
     # analyse the stock data
@@ -16,13 +31,108 @@ def analyseStockBySymbol(symbol, growthRateEstimated=None, margin_of_safety=None
     sa.printBasicAnalysis()
     sa.createPDF()
 
+    score, comment = sa.calcPiotroskiFScore()
+    result = {
+        'Graham number': sa.GrahamNumber,
+        'DCF value': sa.PresentShareValue,
+        'Piotroski F Score': score,
+        # only the rows of the financial statements, which are needed for the ratios of all stocks (see analyseStocksBySymbol)
+        'statements': stock.financialStatements.reindex(Ratios.statementRows())
+    }
+
+    # percentiles of the DCF value for randomly drawn assumptions
+    if monteCarloPaths > 0:
+        percentiles = sa.calcDCFMonteCarlo(paths=monteCarloPaths)
+        if percentiles is not None:
+            print('DCF value (Monte Carlo, {n:d} paths): '.format(n=monteCarloPaths) + ', '.join(['P{p:d}: {v:.2f}'.format(p=p,v=v) for p,v in percentiles.items()]))
+            for p in [5, 50, 95]:
+                result['DCF P' + str(p)] = percentiles[p]
+
+    return result
+
+
+def _analyseStockSafely(symbol, growthRateEstimated=None, margin_of_safety=None, discountRate=None, monteCarloPaths=0):
+    # a failing stock must not stop the analysis of all other stocks in the batch
+    try:
+        return analyseStockBySymbol(symbol, growthRateEstimated, margin_of_safety, discountRate, monteCarloPaths)
+    except Exception as e:
+        return {'error': type(e).__name__ + ': ' + str(e)}
+
+
+def _analyseStockInWorker(symbol, growthRateEstimated=None, margin_of_safety=None, discountRate=None, monteCarloPaths=0):
+    # the output of a worker process is collected and printed by the main process,
+    # so the reports of the stocks are not mixed up
+    report = io.StringIO()
+    with redirect_stdout(report):
+        result = _analyseStockSafely(symbol, growthRateEstimated, margin_of_safety, discountRate, monteCarloPaths)
+    result['report'] = report.getvalue()
+    return result
+
+
+def _initWorker(workers):
+    # all worker processes share the rate limits of the APIs
+    from utils.rate_limit import setSharingProcesses
+    setSharingProcesses(workers)
+
+    # DataFrames are always printed completely (as in the main process)
+    from utils.generic import setPandasDisplayOptions
+    setPandasDisplayOptions()
+
 
-def save_config(arguments):
-    if (arguments.discountRate is not None) or (arguments.growthRate is not None) or (arguments.margin_of_safety is not None):
+def analyseStocksBySymbol(symbols, workers=1, growthRateEstimated=None, margin_of_safety=None, discountRate=None, monteCarloPaths=0):
+    """
+        Analyses all stocks and returns a summary table (one row per symbol) and the financial
+        ratios of all stocks (index (symbol, ratio), one column per fiscal year).
+        The stocks are analysed in a pool of worker processes. Each worker imports the modules
+        only once and keeps its connections open for all stocks it analyses. The report of each
+        stock is printed as a whole in the order of the symbols.
+    """
+    n = len(symbols)
+    if workers <= 1:
+        results = [_analyseStockSafely(symbol, growthRateEstimated, margin_of_safety, discountRate, monteCarloPaths) for symbol in symbols]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(workers,)) as executor:
+            results = []
+            for result in executor.map(_analyseStockInWorker, symbols, [growthRateEstimated]*n, [margin_of_safety]*n, [discountRate]*n, [monteCarloPaths]*n):
+                print(result.pop('report'), end='')
+                results.append(result)
+
+    from pandas import DataFrame
+    from classes import Ratios
+
+    # the ratios of all stocks are calculated together as one panel (symbols x years)
+    statements = {}
+    for symbol, result in zip(symbols, results):
+        financialStatements = result.pop('statements', None)
+        if financialStatements is not None:
+            statements[symbol] = financialStatements
+    ratios = Ratios.evaluatePanel(statements)
+    latestRatios = Ratios.latestValues(ratios).reindex(index=symbols, columns=list(SUMMARY_RATIOS.values()))
+
+    summary = DataFrame(results, index=symbols, columns=SUMMARY_COLUMNS)
+    for column, ratio in SUMMARY_RATIOS.items():
+        summary[column] = latestRatios[ratio].values
+    summary.index.name = 'symbol'
+    return summary, ratios
+
+
+def loadWatchlist(watchlistFile):
+    # one symbol per line, lines starting with '#' are comments
+    if not os.path.isfile(watchlistFile):
+        raise Exception('The file "' + watchlistFile + '" does not exist.')
+
+    with open(watchlistFile) as f:
+        lines = [line.split('#')[0].strip() for line in f]
+    return [line for line in lines if line != '']
+
+
+def save_config(arguments, symbol):
+    from classes.Stock import Stock
+    if (arguments.discount_rate is not None) or (arguments.growthRate is not None) or (arguments.margin_of_safety is not None):
         config = {}
         config["assumptions"] = {}
 
-        if arguments.discountRate is not None:
+        if arguments.discount_rate is not None:
             config["assumptions"]["discountRate"] = arguments.discount_rate
 
         if arguments.growthRate is not None:
@@ -42,17 +152,44 @@ def save_config(arguments):
 if __name__ == "__main__":
     # Parse the command line arguments
     parser = argparse.ArgumentParser(description='Create a minimum stock analysis by the stocks symbol and some optional estimates')
-    parser.add_argument('symbol', metavar='symbol', type=str, help='symbol of the stock')
+    parser.add_argument('symbol', metavar='symbol', type=str, nargs='*', help='symbol(s) of the stock(s)')
+    parser.add_argument('--watchlist', help='file with one stock symbol per line', default=None, type=str)
+    parser.add_argument('--workers', help='number of worker processes for the analysis of multiple stocks', default=os.cpu_count() or 1, type=int)
+    parser.add_argument('--summary-file', help='save the summary of multiple stocks in a csv-file', default=None, type=str)
+    parser.add_argument('--ratios-file', help='save the financial ratios of multiple stocks (all years) in a csv-file', default=None, type=str)
     parser.add_argument('--growthRate', help='estimated gowth rate for the next 5 years', default=None, type=float)
     parser.add_argument('--discount-rate', help='discount rate for use int the discounted cash flow calculation', default=None, type=float)
     parser.add_argument('--margin-of-safety', help='margin of safety as value in percent', default=None, type=float)
     parser.add_argument('--save-config', action='store_true', help='save the cofiguration in a json-file')
+    parser.add_argument('--monte-carlo', help='number of paths for a Monte Carlo simulation of the DCF assumptions (0: no simulation)', default=0, type=int)
     args = parser.parse_args()
-    
-    # analyse the stock
-    analyseStockBySymbol(symbol=args.symbol, growthRateEstimated=args.growthRate, margin_of_safety=args.margin_of_safety, discountRate=args.discount_rate)
+
+    # DataFrames are always printed completely
+    from utils.generic import setPandasDisplayOptions
+    setPandasDisplayOptions()
+
+    symbols = list(args.symbol)
+    if args.watchlist is not None:
+        symbols += loadWatchlist(args.watchlist)
+
+    if len(symbols) == 0:
+        parser.error('at least one symbol or a watchlist is needed')
+
+    if len(symbols) == 1:
+        # analyse the stock
+        analyseStockBySymbol(symbol=symbols[0], growthRateEstimated=args.growthRate, margin_of_safety=args.margin_of_safety, discountRate=args.discount_rate, monteCarloPaths=args.monte_carlo)
+    else:
+        # analyse all stocks and print the summary
+        summary, ratios = analyseStocksBySymbol(symbols, workers=min(args.workers,len(symbols)), growthRateEstimated=args.growthRate, margin_of_safety=args.margin_of_safety, discountRate=args.discount_rate, monteCarloPaths=args.monte_carlo)
+        print(summary.to_string())
+
+        if args.summary_file is not None:
+            summary.to_csv(args.summary_file)
+
+        if args.ratios_file is not None:
+            ratios.to_csv(args.ratios_file)
 
     # Optional: Save the configuration
     if args.save_config:
-        save_config(args)
-        
\ No newline at end of file
+        for symbol in symbols:
+            save_config(args, symbol)
@@ -0,0 +1,112 @@
+# Benchmark: building the DataFrames of FinnhubClient.getFinancialsAsReportedDataFrame
+#
+# The former implementation filled the DataFrames cell by cell with .loc, the current one
+# collects long-format records and pivots them once. Both results must be identical.
+#
+# usage: python benchmarks/bench_financials_as_reported.py [recorded_payload.json]
+# The payload is the list, which is returned by FinnhubClient.getFinancialsAsReported().
+# Without a payload, a synthetic report with 10 years and 300 concepts per statement is used.
+
+import sys, os
+import json
+import time
+import numpy as np
+from datetime import datetime
+from pandas import DataFrame
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.FinnhubAPI import FinnhubClient
+from classes.GlobalVariables import *
+
+
+def createSyntheticPayload(years=10,conceptsPerStatement=300):
+    rng = np.random.RandomState(0)
+    data = []
+    for year in range(2020,2020-years,-1):
+        report = {}
+        for statement in ['bs','ic','cf']:
+            concepts = ['%sConcept%d' % (statement,i) for i in range(conceptsPerStatement)]
+            # not every concept is reported every year
+            concepts = [c for c in concepts if rng.rand() > 0.1]
+            report[statement] = [{'concept': c, 'value': float(rng.randint(-10**9,10**9))} for c in concepts]
+        report['ic'] += [{'concept': 'NetIncomeLoss', 'value': 1.0e9}, {'concept': 'Revenues', 'value': 5.0e9}, {'concept': 'OperatingIncomeLoss', 'value': 2.0e9}]
+        report['bs'] += [{'concept': 'StockholdersEquity', 'value': 3.0e9}, {'concept': 'Assets', 'value': 9.0e9}]
+        report['cf'] += [{'concept': 'NetCashProvidedByUsedInOperatingActivities', 'value': 2.5e9}]
+        data.append({'endDate': '%d-06-30 00:00:00' % year, 'report': report})
+    return data
+
+
+def _legacyGetValue(statement,keys):
+    if isinstance(keys,str):
+        keys = [keys]
+    for key in keys:
+        for item in statement:
+            if item['concept'] == key:
+                return item['value']
+    return np.nan
+
+
+def legacyFinancialsAsReportedDataFrame(data):
+    # former implementation (cell by cell)
+    df_fullData = DataFrame()
+    df_mainData = DataFrame()
+
+    for d in data:
+        date = datetime.strptime(d['endDate'],'%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d')
+
+        balanceSheet = d['report']['bs']
+        for bselem in balanceSheet:
+            df_fullData.loc[bselem['concept'],date] = bselem['value']
+
+        incomeStatement = d['report']['ic']
+        for icelem in incomeStatement:
+            df_fullData.loc[icelem['concept'],date] = icelem['value']
+
+        statementOfCashFlows = d['report']['cf']
+        for cfelem in statementOfCashFlows:
+            df_fullData.loc[cfelem['concept'],date] = cfelem['value']
+
+        df_mainData.loc[NET_INCOME,date] = _legacyGetValue(incomeStatement,'NetIncomeLoss')
+        df_mainData.loc[REVENUES,date] = _legacyGetValue(incomeStatement,['Revenues','RevenueFromContractWithCustomerExcludingAssessedTax'])
+        df_mainData.loc[STOCKHOLDERS_EQUITY,date] = _legacyGetValue(balanceSheet,'StockholdersEquity')
+        df_mainData.loc[ASSETS,date] = _legacyGetValue(balanceSheet,'Assets')
+        df_mainData.loc[CASH_FROM_OPERATING_ACTIVITIES,date] = _legacyGetValue(statementOfCashFlows,['NetCashProvidedByUsedInOperatingActivities','NetCashProvidedByUsedInOperatingActivitiesContinuingOperations'])
+        df_mainData.loc[DILUTED_AVERAGE_SHARES,date] = _legacyGetValue(incomeStatement,'WeightedAverageNumberOfDilutedSharesOutstanding')
+        df_mainData.loc[OPERATING_INCOME,date] = _legacyGetValue(incomeStatement,'OperatingIncomeLoss')
+        df_mainData.loc[EBIT,date] = _legacyGetValue(incomeStatement,'OperatingIncomeLoss')
+
+    return df_fullData, df_mainData
+
+
+def timeit(function,repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter()-start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            payload = json.load(f)
+    else:
+        payload = createSyntheticPayload()
+
+    client = FinnhubClient('BENCHMARK')
+    client.getFinancialsAsReported = lambda quarterly=False: payload
+
+    tLegacy, (fullLegacy, mainLegacy) = timeit(lambda: legacyFinancialsAsReportedDataFrame(payload), repeat=1)
+    tCurrent, (full, main) = timeit(client.getFinancialsAsReportedDataFrame)
+
+    full_identical = fullLegacy.equals(full) and list(fullLegacy.index) == list(full.index) and list(fullLegacy.columns) == list(full.columns)
+    # the former implementation never found the free cash flow (see tests/test_finnhub_free_cash_flow.py)
+    main = main.drop(FREE_CASH_FLOW)
+    main_identical = mainLegacy.equals(main) and list(mainLegacy.index) == list(main.index) and list(mainLegacy.columns) == list(main.columns)
+
+    print('full data: %d concepts x %d dates' % full.shape)
+    print('cell by cell: %8.3f s' % tLegacy)
+    print('records:      %8.3f s' % tCurrent)
+    print('speedup:      %8.1fx' % (tLegacy/tCurrent))
+    print('identical:    %s' % (full_identical and main_identical))
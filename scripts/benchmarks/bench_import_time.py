@@ -0,0 +1,62 @@
+# Benchmark: start-up time of the command line interface and of the analysis modules
+#
+# Every statement is run in a new python process (like a worker process of the batch mode),
+# so nothing is imported before. The heavy modules (matplotlib, yfinance, sklearn, commentjson)
+# should only be imported, when they are needed (e.g. matplotlib only to create the PDF).
+#
+# usage: python benchmarks/bench_import_time.py [repeat]
+# For a detailed list of all imports: python -X importtime -c "import classes.StockAnalyzer"
+
+import sys, os
+import time
+import subprocess
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['matplotlib', 'yfinance', 'sklearn', 'commentjson']
+
+STATEMENTS = [
+    ('python', 'pass'),
+    ('classes.Stock', 'import classes.Stock'),
+    ('classes.StockAnalyzer', 'import classes.StockAnalyzer'),
+    ('classes.StockPDF', 'import classes.StockPDF'),
+]
+
+
+def runStatement(statement):
+    # seconds for the start of python and the statement, and the heavy modules, which were imported
+    code = 'import sys; sys.path.insert(0, %r)\n%s\nprint(",".join([m for m in %r if m in sys.modules]))' % (SCRIPTS_FOLDER, statement, HEAVY_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=SCRIPTS_FOLDER, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    duration = time.perf_counter() - start
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return duration, result.stdout.strip()
+
+
+def runHelp():
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(SCRIPTS_FOLDER, 'analyseStockBySymbol.py'), '--help'], cwd=SCRIPTS_FOLDER, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return time.perf_counter() - start if result.returncode == 0 else None
+
+
+def best(times):
+    times = [t for t in times if t is not None]
+    return min(times) if len(times) > 0 else None
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print('%-32s %10s   %s' % ('statement', 'time', 'heavy modules'))
+    for name, statement in STATEMENTS:
+        results = [runStatement(statement) for i in range(repeat)]
+        duration = best([d for d, modules in results])
+        modules = results[-1][1]
+        if duration is None:
+            print('%-32s %10s   %s' % (name, 'failed', modules))
+        else:
+            print('%-32s %8.3f s   %s' % (name, duration, modules if modules != '' else '-'))
+
+    duration = best([runHelp() for i in range(repeat)])
+    print('%-32s %8.3f s' % ('analyseStockBySymbol.py --help', duration) if duration is not None else '%-32s %10s' % ('analyseStockBySymbol.py --help', 'failed'))
@@ -0,0 +1,82 @@
+# Micro-benchmark: utils.generic.mergeDataFrame
+#
+# The former implementation merged cell by cell (date conversion, .loc read, np.isnan and .loc
+# write for every cell), the current one aligns both DataFrames at once. The merges are nested
+# like for the financial statements of one stock (see YFinanceClient and DataLoader): the extra
+# data of the yahoo pages (dates as strings) is merged into the yfinance statements (dates as
+# DatetimeIndex), these into the balance sheet and the result into the Finnhub data.
+#
+# usage: python benchmarks/bench_merge_dataframe.py
+
+import sys, os
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.generic import mergeDataFrame, npDateTime64_2_str
+
+
+def legacyMergeDataFrame(dataFrame1,dataFrame2):
+    # former implementation (cell by cell)
+    for row in dataFrame2.index.values:
+        for column in dataFrame2.columns.values:
+            if isinstance(column,np.datetime64):
+                columnName = npDateTime64_2_str(column)
+            else:
+                columnName = column
+
+            if (not dataFrame2.loc[row,column] is None) and (not np.isnan(dataFrame2.loc[row,column])):
+                dataFrame1.loc[row,columnName] = dataFrame2.loc[row,column]
+
+    return dataFrame1
+
+
+def createFrames(rng):
+    # Finnhub main data: 9 rows, 10 years, dates as strings
+    years = ['%d-06-30' % y for y in range(2020,2010,-1)]
+    finnhub = pd.DataFrame(rng.rand(9,10)*1e9, index=['finnhub%d' % i for i in range(9)], columns=years)
+
+    # yfinance statements: about 30 rows, 4 years, dates as DatetimeIndex, some NaN values
+    def yahooStatement(prefix,rows):
+        values = rng.rand(rows,4)*1e9
+        values[rng.rand(rows,4) < 0.1] = np.nan
+        return pd.DataFrame(values, index=[prefix + str(i) for i in range(rows)], columns=pd.to_datetime(years[:4]))
+
+    # extra data of the yahoo pages: some rows overlap with the statements
+    def extraData(prefix,rows):
+        return pd.DataFrame(rng.rand(rows,4), index=[prefix + str(i) for i in range(rows)], columns=years[:4])
+
+    return [finnhub, yahooStatement('balance',30), yahooStatement('income',25), extraData('income',4), yahooStatement('cashflow',20), extraData('cashflow',1)]
+
+
+def mergeChain(merge,frames):
+    # the legacy implementation changes dataFrame1, so every merge gets copies
+    finnhub, balance, income, extraIncome, cashflow, extraCashflow = [frame.copy() for frame in frames]
+    income = merge(income,extraIncome)
+    cashflow = merge(cashflow,extraCashflow)
+    yahoo = merge(merge(balance,income),cashflow)
+    return merge(finnhub,yahoo)
+
+
+def timeit(function,repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        result = function()
+    return (time.perf_counter()-start)/repeat, result
+
+
+if __name__ == "__main__":
+    frames = createFrames(np.random.RandomState(0))
+
+    tLegacy, legacy = timeit(lambda: mergeChain(legacyMergeDataFrame,frames), repeat=3)
+    tCurrent, current = timeit(lambda: mergeChain(mergeDataFrame,frames), repeat=20)
+
+    identical = legacy.reindex(index=current.index, columns=current.columns).equals(current) and (set(legacy.index) == set(current.index)) and (set(legacy.columns) == set(current.columns))
+    assert identical, 'The merged DataFrame differs from the one of the former implementation'
+
+    print('merged: %d rows x %d columns' % current.shape)
+    print('cell by cell: %8.4f s per stock' % tLegacy)
+    print('aligned:      %8.4f s per stock' % tCurrent)
+    print('speedup:      %8.1fx' % (tLegacy/tCurrent))
+    print('identical:    %s' % identical)
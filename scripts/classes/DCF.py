@@ -0,0 +1,143 @@
+import numpy as np
+
+# Discounted cash flow model with three stages of growth
+#
+# - years 1-5: the free cash flow grows with growth_year_1_to_5
+# - years 6-10: the free cash flow grows with growth_year_6_to_10
+# - after year 10: perpetuity value with growth_year_10ff
+#
+# All rates are fractions (e.g. 0.09 for 9%). Every argument can be a scalar or an array. The
+# arrays are broadcast against each other, so many scenarios are evaluated in one computation.
+
+# number of years, which are estimated one by one
+YEARS = 10
+# last year of the first stage
+FIRST_STAGE_YEARS = 5
+
+
+def projectFreeCashFlows(startValue,growth_year_1_to_5,growth_year_6_to_10):
+    """
+        Free cash flows of the years 1-10 as array with the shape of the broadcast arguments + (10,)
+    """
+    years = np.arange(1,YEARS+1)
+    yearsFirstStage = np.minimum(years,FIRST_STAGE_YEARS)
+    yearsSecondStage = np.maximum(years-FIRST_STAGE_YEARS,0)
+
+    g1 = np.asarray(growth_year_1_to_5, dtype='float64')[...,np.newaxis]
+    g2 = np.asarray(growth_year_6_to_10, dtype='float64')[...,np.newaxis]
+    return np.asarray(startValue, dtype='float64')[...,np.newaxis] * (1+g1)**yearsFirstStage * (1+g2)**yearsSecondStage
+
+
+def presentValues(startValue,discountRate,growth_year_1_to_5,growth_year_6_to_10,growth_year_10ff):
+    """
+        Returns the free cash flows and their present values:
+        - FCF: free cash flows of the years 1-10 (shape of the broadcast arguments + (10,))
+        - discountedFCF: present values of FCF
+        - perpetuityValue: value of all free cash flows after year 10 at the end of year 10
+        - discountedPerpetuityValue: present value of perpetuityValue
+    """
+    FCF = projectFreeCashFlows(startValue,growth_year_1_to_5,growth_year_6_to_10)
+
+    r = np.asarray(discountRate, dtype='float64')
+    g3 = np.asarray(growth_year_10ff, dtype='float64')
+    discountFactors = (1+r[...,np.newaxis])**np.arange(1,YEARS+1)
+    discountedFCF = FCF/discountFactors
+
+    # Formel: FCF_10 * (1 + growthRate_10) / (discountRate - growthRate_10)
+    perpetuityValue = FCF[...,-1]*(1+g3)/(r-g3)
+    discountedPerpetuityValue = perpetuityValue/discountFactors[...,-1]
+
+    return FCF, discountedFCF, perpetuityValue, discountedPerpetuityValue
+
+
+def perShareValue(startValue,sharesOutstanding,discountRate,growth_year_1_to_5,growth_year_6_to_10,growth_year_10ff,marginOfSafety):
+    """
+        Value per share including the margin of safety (shape of the broadcast arguments)
+    """
+    FCF, discountedFCF, perpetuityValue, discountedPerpetuityValue = presentValues(startValue,discountRate,growth_year_1_to_5,growth_year_6_to_10,growth_year_10ff)
+    totalEquityValue = discountedFCF.sum(axis=-1) + discountedPerpetuityValue
+    return totalEquityValue/sharesOutstanding/(1+np.asarray(marginOfSafety, dtype='float64'))
+
+
+def sensitivityGrid(startValue,sharesOutstanding,discountRates,growthRates,marginsOfSafety):
+    """
+        Value per share for all combinations of the assumptions
+        - discountRates: array of n_r discount rates
+        - growthRates: array of shape (n_g,3) with the growth rates of the three stages
+        - marginsOfSafety: array of n_m margins of safety
+        Returns an array of shape (n_g, n_r, n_m). Combinations with a discount rate, which is not at least
+        MIN_PERPETUITY_SPREAD above the perpetual growth rate, have no perpetuity value and are NaN.
+    """
+    growthRates = np.asarray(growthRates, dtype='float64').reshape(-1,3)
+    discountRates = np.asarray(discountRates, dtype='float64').reshape(1,-1,1)
+    marginsOfSafety = np.asarray(marginsOfSafety, dtype='float64').reshape(1,1,-1)
+
+    g1, g2, g3 = [growthRates[:,i].reshape(-1,1,1) for i in range(3)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = perShareValue(startValue,sharesOutstanding,discountRates,g1,g2,g3,marginsOfSafety)
+    isDefined = np.broadcast_to(discountRates - g3 >= MIN_PERPETUITY_SPREAD, values.shape)
+    return np.where(isDefined, values, np.nan)
+
+
+# Monte Carlo simulation of the assumptions
+#
+# Each assumption is drawn from a distribution around its centre (the assumption of the stock).
+# A distribution is a tuple (name, width) with the width as fraction:
+# - ('normal', standard deviation)
+# - ('uniform', half of the range)
+# - ('triangular', half of the range)
+# - ('fixed', ignored): the assumption is not varied
+DEFAULT_DISTRIBUTIONS = {
+    'discountRate': ('normal', 0.01),
+    'growth_year_1_to_5': ('normal', 0.03),
+    'growth_year_6_to_10': ('normal', 0.02),
+    'growth_year_10ff': ('normal', 0.005),
+    'margin_of_safety': ('fixed', 0),
+}
+
+# minimum difference between the discount rate and the perpetual growth rate
+# (the perpetuity value is only defined for growth_year_10ff < discountRate)
+MIN_PERPETUITY_SPREAD = 0.005
+
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def sampleAssumption(rng,centre,distribution,paths):
+    name, width = distribution
+    if name == 'normal':
+        return rng.normal(centre, width, paths)
+    elif name == 'uniform':
+        return rng.uniform(centre-width, centre+width, paths)
+    elif name == 'triangular':
+        return rng.triangular(centre-width, centre, centre+width, paths)
+    elif name == 'fixed':
+        return np.full(paths, centre, dtype='float64')
+    else:
+        raise ValueError('The distribution "' + str(name) + '" is not supported. Supported distributions: normal, uniform, triangular, fixed')
+
+
+def monteCarlo(startValue,sharesOutstanding,assumptions,paths=100000,distributions=None,seed=None):
+    """
+        Values per share of randomly drawn assumptions as array with "paths" values
+        - assumptions: dict with the centres of the assumptions as fractions (keys of DEFAULT_DISTRIBUTIONS)
+        - distributions: dict with the distributions, which differ from DEFAULT_DISTRIBUTIONS
+        - seed: seed of the random number generator (for reproducible results)
+    """
+    if distributions is None:
+        distributions = {}
+
+    rng = np.random.RandomState(seed)
+    samples = {}
+    for key, defaultDistribution in DEFAULT_DISTRIBUTIONS.items():
+        samples[key] = sampleAssumption(rng, assumptions[key], distributions.get(key,defaultDistribution), paths)
+
+    # paths with a perpetual growth rate close to or above the discount rate are limited
+    growth_year_10ff = np.minimum(samples['growth_year_10ff'], samples['discountRate']-MIN_PERPETUITY_SPREAD)
+
+    return perShareValue(startValue, sharesOutstanding, samples['discountRate'], samples['growth_year_1_to_5'],
+        samples['growth_year_6_to_10'], growth_year_10ff, samples['margin_of_safety'])
+
+
+def percentiles(values,q=DEFAULT_PERCENTILES):
+    # percentiles of the simulated values per share as dict percentile -> value
+    return dict(zip(q, [float(v) for v in np.percentile(values,q)]))
@@ -1,17 +1,23 @@
 
-from classes.FinnhubAPI import FinnhubClient
+from classes.FinnhubAPI import FinnhubClient, getFinnhubClient
 from classes.YFinanceAPI import YFinanceClient
 from utils.generic import mergeDataFrame
+from utils.statements_store import getStatementsStore, needsRefresh
 from classes.GlobalVariables import *
 
 class DataLoader():
 
-    def __init__(self,symbol):
+    # names of the sources of the financial statements in the order of the merge
+    SOURCES = ['finnhub', 'yahoo']
+
+    def __init__(self,symbol,dates=None):
 
         # initialize variables
         self.initVariables()
 
         self.symbol = symbol
+        # dates of the reports (dict "dates" of the stock data file), used to decide if the stored statements are outdated
+        self.dates = dates
 
 
     def initVariables(self):
@@ -33,7 +39,7 @@ class DataLoader():
     @property
     def FinnhubClient(self):
         if self._finnhubClient is None:
-            self._finnhubClient = FinnhubClient(self.symbol)
+            self._finnhubClient = getFinnhubClient(self.symbol)
 
         return self._finnhubClient
 
@@ -62,13 +68,48 @@ class DataLoader():
 
 
     def getFinancialStatements(self):
+        # stored financial statements, if there can not be a newer fiscal period
+        financialStatements = self.getStoredFinancialStatements()
+        if financialStatements is not None:
+            return financialStatements
+
         # load financial statements from Finnhub
         finnhubFinancialStatements = self.getFinnhubFinancialStatements()
         yfinanceFinancialStatements = self.getYahooFinancialStatements()
         
         # merge data
-        df = mergeDataFrame(finnhubFinancialStatements,yfinanceFinancialStatements)
-        return df
+        financialStatements = self.mergeFinancialStatements(finnhubFinancialStatements,yfinanceFinancialStatements)
+        self.storeFinancialStatements(financialStatements,finnhubFinancialStatements,yfinanceFinancialStatements)
+        return financialStatements
+
+
+    def getStoredFinancialStatements(self):
+        # returns None, if the statements are not stored or if a newer fiscal period could have been published
+        stored = getStatementsStore().load(self.symbol)
+        if stored is None:
+            return None
+
+        financialStatements, provenance, meta = stored
+        if needsRefresh(meta,financialStatements.columns,self.dates):
+            return None
+        return financialStatements
+
+
+    def storeFinancialStatements(self,financialStatements,finnhubFinancialStatements,yfinanceFinancialStatements):
+        # nothing is stored, if the download failed
+        if financialStatements.size == 0:
+            return
+
+        # the store is only a cache, so the analysis goes on, if it can not be written
+        try:
+            getStatementsStore().save(self.symbol,financialStatements,[finnhubFinancialStatements,yfinanceFinancialStatements],self.SOURCES)
+        except OSError:
+            pass
+
+
+    def mergeFinancialStatements(self,finnhubFinancialStatements,yfinanceFinancialStatements):
+        # the data of yahoo finance overrides the data of finnhub
+        return mergeDataFrame(finnhubFinancialStatements,yfinanceFinancialStatements)
 
 
     def getYahooFinancialStatements(self):
@@ -1,13 +1,52 @@
 
 import os
-import requests
+import threading
 import numpy as np
 from datetime import datetime
+import pandas as pd
 from pandas import DataFrame
 import json
 
-from utils.generic import npDateTime64_2_str
+from utils.http_cache import cachedFetch, ENDPOINT_TTL, DEFAULT_TTL
+from utils.rate_limit import getTokenBucket, rateLimitedGet
+from utils.singleflight import SingleFlight
 from classes.GlobalVariables import *
+from classes.FinnhubConcepts import STATEMENTS, MAIN_DATA, indexReport, resolveConcepts, calcFreeCashFlow
+
+
+# identical concurrent requests of all clients share one network call and its parsed result;
+# the parsed results are kept in memory for the time to live of the endpoint (as in the response cache)
+_singleFlight = SingleFlight()
+
+# one client per symbol
+_clients = {}
+_clientsLock = threading.Lock()
+
+def recordsToDataFrame(records):
+    """
+        Creates a DataFrame with one row per concept and one column per date from a list of
+        records (concept, date, value). The rows and columns are in the order, in which they
+        appear first in the records. If a concept is listed more than once for a date, the last value is used.
+    """
+    if len(records) == 0:
+        return DataFrame()
+
+    df = DataFrame.from_records(records, columns=['concept','date','value'])
+    rows = pd.unique(df['concept'])
+    columns = pd.unique(df['date'])
+
+    df = df.drop_duplicates(subset=['concept','date'], keep='last')
+    df = df.pivot(index='concept', columns='date', values='value').reindex(index=rows, columns=columns)
+    df.index.name = None
+    df.columns.name = None
+    return df.astype(np.float64)
+
+
+def getFinnhubClient(symbol):
+    with _clientsLock:
+        if symbol not in _clients:
+            _clients[symbol] = FinnhubClient(symbol)
+        return _clients[symbol]
 
 
 class FinnhubClient():
@@ -17,10 +56,16 @@ class FinnhubClient():
 
     NOT_DATA_VALUE = np.nan
 
+    # rate limit of the API key (free plan: 60 requests per minute)
+    # the burst comes on top of the rate, so the rate is reduced by the burst:
+    # in any minute at most BURST + 60*REQUESTS_PER_SECOND = 60 requests are sent
+    REQUESTS_PER_MINUTE = 60
+    BURST = 5
+    REQUESTS_PER_SECOND = (REQUESTS_PER_MINUTE - BURST)/60.0
+
     def __init__(self,symbol):
-        self.symbol = symbol
-        self.getPeerGroup()
         self._APIkey = None
+        self.symbol = symbol
 
     @property
     def APIkey(self):
@@ -30,46 +75,76 @@ class FinnhubClient():
                 self._APIkey = json.load(f)['APIkey']
         return self._APIkey
 
+    @property
+    def rateLimiter(self):
+        # the token bucket is shared by all clients with the same API key
+        return getTokenBucket(self.APIkey, self.REQUESTS_PER_SECOND, self.BURST)
+
+
+    def _request(self,endpoint,**params):
+        # all requests go through the response cache and the rate limiter
+        # None is returned (and the status is printed), if the request failed;
+        # RateLimitExceeded is raised, if it was throttled too often
+        params['symbol'] = self.symbol
+        params['token'] = self.APIkey
+        url = self.baseUrl + endpoint
+
+        def fetch():
+            r = rateLimitedGet(self.rateLimiter, url, params=params)
+            if not r.ok:
+                print(' +++ Finnhub request "' + endpoint + '" for ' + self.symbol + ' failed (HTTP ' + str(r.status_code) + ') +++ ')
+                return None
+            return r.content
+
+        def load():
+            content = cachedFetch(url, endpoint, fetch, params=params)
+            if content is None:
+                return None
+            return json.loads(content)
+
+        key = (endpoint,) + tuple(sorted([(k,v) for k,v in params.items() if k != 'token']))
+        return _singleFlight.do(key, load, ttl=ENDPOINT_TTL.get(endpoint,DEFAULT_TTL))
+
 
     def getData(self):
         print('Open and close data')
-        r = requests.get(self.baseUrl + 'quote?symbol=' + self.symbol + '&token=' + self.APIkey)
-        if r.ok:
-            return r.json()
+        data = self._request('quote')
+        if data is not None:
+            return data
         else:
             return ''
 
 
     def getDividend(self,startDate="2015-04-01",endDate="2020-04-01"):
         print('Dividend')
-        r = requests.get(self.baseUrl + 'stock/dividend?symbol=' + self.symbol + '&from=' + startDate + '&to=' + endDate + '&token=' + self.APIkey)
-        if r.ok:
-            return r.json()
+        data = self._request('stock/dividend', **{'from': startDate, 'to': endDate})
+        if data is not None:
+            return data
         else: 
             return ''
 
 
     def getPeerGroup(self):
-        r = requests.get(self.baseUrl + 'stock/peers?symbol=' + self.symbol + '&token=' + self.APIkey)
-        if not r.ok:
+        data = self._request('stock/peers')
+        if data is None:
             return ''
         else:
-            return r.json()
+            return data
 
 
     def getMetricsPerShare(self):
         print('Metrics per share')
-        r = requests.get(self.baseUrl + 'stock/metric?symbol=' + self.symbol + '&metric=perShare&token=' + self.APIkey)
-        if r.ok:
-            return r.json()
+        data = self._request('stock/metric', metric='perShare')
+        if data is not None:
+            return data
         else:
             return ''
 
 
     def getRecommendations(self):
-        r = requests.get(self.baseUrl + 'stock/recommendation?symbol=' + self.symbol + '&token=' + self.APIkey)
-        if r.ok:
-            return r.json()
+        data = self._request('stock/recommendation')
+        if data is not None:
+            return data
         else:
             return ''
 
@@ -82,7 +157,7 @@ class FinnhubClient():
         df = DataFrame()
 
         # check if the received data is not empty
-        if recommendations is not '':
+        if len(recommendations) > 0:
 
             # add all items to the data frame
             for recommendation in recommendations:
@@ -100,103 +175,50 @@ class FinnhubClient():
 
 
     def getEpsEstimates(self):
-        r = requests.get(self.baseUrl + 'stock/eps-estimate?symbol=' + self.symbol + '&freq=annual&token=' + self.APIkey)
-        if r.ok:
-            return r.json()['data']
+        data = self._request('stock/eps-estimate', freq='annual')
+        if data is not None:
+            return data['data']
         else:
             return []
 
 
     def getFinancialsAsReported(self,quarterly=False):
-        r = requests.get(self.baseUrl + 'stock/financials-reported?symbol=' + self.symbol + '&freq=annual&token=' + self.APIkey)
-        if r.ok:
-            return r.json()['data']
+        data = self._request('stock/financials-reported', freq='annual')
+        if data is not None:
+            return data['data']
         else:
             return []
 
     def getFinancialsAsReportedDataFrame(self,quarterly=False):
 
-        df_fullData = DataFrame()
-        df_mainData = DataFrame()
-
         # get reported financial data
         data = self.getFinancialsAsReported(quarterly=quarterly)
 
         # if no data is available, then an empty DataFrame is returned
         # the reason for receiving no data is perhaps, that the company is not from the US
         if len(data) == 0:
-            return df_fullData, df_mainData
+            return DataFrame(), DataFrame()
+
+        # all values are collected as records (concept, date, value) in long format
+        # and turned into the wide DataFrames at once
+        fullRecords = []
+        mainRecords = []
 
         for d in data:
             date = self.__getDateFromTime(d['endDate'])
-            #print(date)
-
-            # run over all entries in the balance sheet
-            balanceSheet = d['report']['bs']
-            for index, bselem in enumerate(balanceSheet):
-                df_fullData.loc[bselem['concept'],date] = balanceSheet[index]['value']
-
-            # run over all entires in the income statement
-            incomeStatement = d['report']['ic']
-            for index, icelem in enumerate(incomeStatement):
-                df_fullData.loc[icelem['concept'],date] = incomeStatement[index]['value']
-
-            # run over all entires in the statement of cash flows
-            statementOfCashFlows = d['report']['cf']
-            for index, cfelem in enumerate(statementOfCashFlows):
-                df_fullData.loc[cfelem['concept'],date] = statementOfCashFlows[index]['value']
-
-            ## Free cash flow
-            cashFlowFromOperations = None 
-            if ('NetCashProvidedByUsedInOperatingActivities' in statementOfCashFlows):
-                cashFlowFromOperations = statementOfCashFlows['NetCashProvidedByUsedInOperatingActivities']
-            elif ('NetCashProvidedByUsedInOperatingActivitiesContinuingOperations' in statementOfCashFlows):
-                cashFlowFromOperations = statementOfCashFlows['NetCashProvidedByUsedInOperatingActivitiesContinuingOperations']
-            
-            capitalSpending = None
-            if ('PaymentsToAcquirePropertyPlantAndEquipment' in statementOfCashFlows):
-                capitalSpending = statementOfCashFlows['PaymentsToAcquirePropertyPlantAndEquipment']
-
-            if ('PaymentsToAcquireIntangibleAssets' in statementOfCashFlows) and (capitalSpending is not None):
-                if not np.isnan(statementOfCashFlows['PaymentsToAcquireIntangibleAssets']):
-                    capitalSpending += statementOfCashFlows['PaymentsToAcquireIntangibleAssets']
-
-            if (cashFlowFromOperations is not None):
-                # e.g. for bank companies there is no capitalSpending in the statement of cashflows
-                if (capitalSpending is not None):
-                    df_mainData.loc[FREE_CASH_FLOW,date] = cashFlowFromOperations - capitalSpending
-                else:
-                    df_mainData.loc[FREE_CASH_FLOW,date] = cashFlowFromOperations
-
-            ## Net income
-            df_mainData.loc[NET_INCOME,date] = self._getValueFromDict(incomeStatement,'NetIncomeLoss')
 
-            ## Revenues/Sales
-            key = 'Revenues'
-            key2 = 'RevenueFromContractWithCustomerExcludingAssessedTax'
-            df_mainData.loc[REVENUES,date] = self._getValueFromDict(incomeStatement,[key,key2])
+            # all entries in the balance sheet, the income statement and the statement of cash flows
+            report = d['report']
+            for statement in STATEMENTS:
+                fullRecords.extend([(item['concept'], date, item['value']) for item in report[statement]])
 
-            ## Stock Holders Equity
-            df_mainData.loc[STOCKHOLDERS_EQUITY,date] = self._getValueFromDict(balanceSheet,'StockholdersEquity')
+            # each report is indexed once and all line items are resolved in one pass
+            values = resolveConcepts(indexReport(report))
+            values[FREE_CASH_FLOW] = calcFreeCashFlow(values)
 
-            ## Assets
-            df_mainData.loc[ASSETS,date] = self._getValueFromDict(balanceSheet,'Assets')
-
-            ## Cash from operating activities
-            key = 'NetCashProvidedByUsedInOperatingActivities'
-            key2 = 'NetCashProvidedByUsedInOperatingActivitiesContinuingOperations'
-            df_mainData.loc[CASH_FROM_OPERATING_ACTIVITIES,date] = self._getValueFromDict(statementOfCashFlows,[key,key2])
-
-            ## Number of diluted average shares
-            df_mainData.loc[DILUTED_AVERAGE_SHARES,date] = self._getValueFromDict(incomeStatement,'WeightedAverageNumberOfDilutedSharesOutstanding')
-
-            ## Operating income
-            df_mainData.loc[OPERATING_INCOME,date] = self._getValueFromDict(incomeStatement,'OperatingIncomeLoss')
-
-            ## Ebit
-            df_mainData.loc[EBIT,date] = self._getValueFromDict(incomeStatement,'OperatingIncomeLoss')
+            mainRecords.extend([(lineItem, date, values[lineItem]) for lineItem in MAIN_DATA])
             
-        return df_fullData, df_mainData
+        return recordsToDataFrame(fullRecords), recordsToDataFrame(mainRecords)
 
 
     def __getDateFromTime(self,dateTimeString,format='%Y-%m-%d %H:%M:%S'):
@@ -204,21 +226,8 @@ class FinnhubClient():
 
 
     def getCompanyProfile(self):
-        r = requests.get(self.baseUrl + 'stock/profile2?symbol=' + self.symbol + '&freq=annual&token=' + self.APIkey)
-        if r.ok:
-            return r.json()
+        data = self._request('stock/profile2', freq='annual')
+        if data is not None:
+            return data
         else:
             return []
-
-
-    def _getValueFromDict(self,statement,keys):
-
-        if isinstance(keys,str):
-            keys = [keys]
-
-        for key in keys:
-            for item in statement:
-                if item['concept'] == key:
-                    return item['value']
-        
-        return self.NOT_DATA_VALUE
@@ -0,0 +1,75 @@
+import numpy as np
+
+from classes.GlobalVariables import *
+
+# Mapping of the line items to the XBRL concepts of the financial reports of Finnhub
+#
+# Each line item is listed with the statement, in which it is reported, and an ordered list of
+# concepts. The first concept, which is found in the report, is used. If a company uses another
+# concept for a line item, it only needs to be added to the list.
+
+# statements of a report
+BALANCE_SHEET = 'bs'
+INCOME_STATEMENT = 'ic'
+CASH_FLOW_STATEMENT = 'cf'
+
+STATEMENTS = [BALANCE_SHEET, INCOME_STATEMENT, CASH_FLOW_STATEMENT]
+
+# value, if none of the concepts is in the report
+NOT_DATA_VALUE = np.nan
+
+# line items, which are only needed to calculate other line items
+CAPITAL_EXPENDITURE = 'capitalExpenditure'
+PAYMENTS_FOR_INTANGIBLE_ASSETS = 'paymentsForIntangibleAssets'
+
+CONCEPTS = {
+    NET_INCOME: (INCOME_STATEMENT, ['NetIncomeLoss']),
+    REVENUES: (INCOME_STATEMENT, ['Revenues', 'RevenueFromContractWithCustomerExcludingAssessedTax']),
+    STOCKHOLDERS_EQUITY: (BALANCE_SHEET, ['StockholdersEquity']),
+    ASSETS: (BALANCE_SHEET, ['Assets']),
+    CASH_FROM_OPERATING_ACTIVITIES: (CASH_FLOW_STATEMENT, ['NetCashProvidedByUsedInOperatingActivities', 'NetCashProvidedByUsedInOperatingActivitiesContinuingOperations']),
+    DILUTED_AVERAGE_SHARES: (INCOME_STATEMENT, ['WeightedAverageNumberOfDilutedSharesOutstanding']),
+    OPERATING_INCOME: (INCOME_STATEMENT, ['OperatingIncomeLoss']),
+    EBIT: (INCOME_STATEMENT, ['OperatingIncomeLoss']),
+    CAPITAL_EXPENDITURE: (CASH_FLOW_STATEMENT, ['PaymentsToAcquirePropertyPlantAndEquipment']),
+    PAYMENTS_FOR_INTANGIBLE_ASSETS: (CASH_FLOW_STATEMENT, ['PaymentsToAcquireIntangibleAssets']),
+}
+
+# line items of the main data, in the order of the rows
+# (the free cash flow is calculated, see calcFreeCashFlow; yahoo finance overrides it in the merged statements)
+MAIN_DATA = [FREE_CASH_FLOW, NET_INCOME, REVENUES, STOCKHOLDERS_EQUITY, ASSETS, CASH_FROM_OPERATING_ACTIVITIES,
+    DILUTED_AVERAGE_SHARES, OPERATING_INCOME, EBIT]
+
+
+def indexReport(report):
+    # dict concept -> value for every statement of the report
+    # if a concept is listed more than once, the first value is used
+    return {statement: {item['concept']: item['value'] for item in reversed(report.get(statement,[]))} for statement in STATEMENTS}
+
+
+def resolveConcepts(reportIndex,concepts=CONCEPTS):
+    # value of every line item of the table
+    values = {}
+    for lineItem, (statement, keys) in concepts.items():
+        statementIndex = reportIndex[statement]
+        values[lineItem] = NOT_DATA_VALUE
+        for key in keys:
+            if key in statementIndex:
+                values[lineItem] = statementIndex[key]
+                break
+    return values
+
+
+def calcFreeCashFlow(values):
+    # free cash flow = cash from operating activities - capital expenditure
+    # e.g. for bank companies there is no capital expenditure in the statement of cashflows
+    cashFlowFromOperations = values[CASH_FROM_OPERATING_ACTIVITIES]
+    capitalSpending = values[CAPITAL_EXPENDITURE]
+
+    if np.isnan(capitalSpending):
+        return cashFlowFromOperations
+
+    if not np.isnan(values[PAYMENTS_FOR_INTANGIBLE_ASSETS]):
+        capitalSpending += values[PAYMENTS_FOR_INTANGIBLE_ASSETS]
+
+    return cashFlowFromOperations - capitalSpending
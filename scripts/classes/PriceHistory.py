@@ -0,0 +1,315 @@
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from pandas import DataFrame
+
+from utils.price_store import getPriceStore, PRICE_COLUMNS
+
+# columns of the daily prices
+COLUMNS = PRICE_COLUMNS
+
+# aggregation of the daily prices for the other resolutions
+AGGREGATION = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Adj Close': 'last', 'Volume': 'sum'}
+# bins of the resolutions (weeks start on monday like the weekly data of yahoo finance)
+RESAMPLE_RULES = {'1wk': 'W-MON', '1mo': 'MS'}
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# columns, which yahoo finance adjusts afterwards (Adj Close after dividends, all prices after splits)
+ADJUSTED_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close']
+# relative tolerance for the comparison of the same trading day of two downloads
+ADJUSTMENT_TOLERANCE = 1e-6
+
+ONE_DAY = np.timedelta64(1,'D')
+
+# one price history per symbol
+_histories = {}
+_historiesLock = threading.Lock()
+
+
+def getPriceHistory(symbol):
+    with _historiesLock:
+        if symbol not in _histories:
+            _histories[symbol] = PriceHistory(symbol)
+        return _histories[symbol]
+
+
+class _AdjustedPrices(Exception):
+    # the known prices were adjusted by yahoo finance in the meantime
+    pass
+
+
+def _toDay(date):
+    # date as numpy.datetime64[D]
+    if isinstance(date,str):
+        date = datetime.strptime(date,DATE_FORMAT)
+    return np.datetime64(pd.Timestamp(date).date(),'D')
+
+
+class PriceHistory():
+    """
+        Daily prices (open, high, low, close, adjusted close and volume) of one symbol.
+        The prices are kept in memory, so every window and resolution is served from the prices,
+        which were already loaded. Only the dates before and after the loaded range are downloaded.
+        The completed trading days are kept in the local price store, so later runs read the requested
+        dates from the store and only download the days after the last stored date. Every download
+        includes one known trading day; if yahoo finance has adjusted it in the meantime (dividend or
+        split), all prices are downloaded again and the store is rewritten.
+        - store: utils.price_store.PriceStore (None: the store in the cache folder)
+    """
+
+    def __init__(self,symbol,store=None):
+        self.symbol = symbol
+        self._prices = DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([],name='Date'), dtype='float64')
+        # range of dates, which was already requested (the first and last date are not necessarily trading days)
+        self._start = None
+        self._end = None
+        self._lock = threading.Lock()
+
+        self._store = store
+        # range of dates of the price store (None: nothing stored); read on first use
+        self._storedRange = None
+        self._storedRangeRead = False
+        # True, if the prices are views of the memory-mapped files of the store
+        self._storedViews = False
+
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = getPriceStore()
+        return self._store
+
+
+    @property
+    def prices(self):
+        return self._prices
+
+
+    def download(self,start,end):
+        # daily prices from start to end (both included) as DataFrame with the columns COLUMNS
+        import yfinance as yf
+        ticker = yf.Ticker(self.symbol)
+        end = pd.Timestamp(end + np.timedelta64(1,'D')).strftime(DATE_FORMAT)
+        prices = ticker.history(start=pd.Timestamp(start).strftime(DATE_FORMAT), end=end, interval='1d', auto_adjust=False, actions=False, debug=False)
+        return prices.reindex(columns=COLUMNS)
+
+
+    def _missingRanges(self,start,end):
+        # ranges of dates, which were not requested yet
+        if self._start is None:
+            return [(start,end)]
+
+        ranges = []
+        if start < self._start:
+            ranges.append((start,self._start - np.timedelta64(1,'D')))
+        if end > self._end:
+            ranges.append((self._end + np.timedelta64(1,'D'),end))
+        return ranges
+
+
+    def load(self,start,end=None):
+        # makes sure, that the prices from start to end are loaded
+        today = np.datetime64(datetime.now().date(),'D')
+        start = _toDay(start)
+        end = today if end is None else min(_toDay(end),today)
+        if end < start:
+            return
+
+        with self._lock:
+            if not self._storedRangeRead:
+                self._readStoredRange()
+
+            if self._storedRange is not None:
+                storedStart, storedEnd = self._storedRange
+                # earlier prices can not be appended to the store, so it is written again with all stored prices
+                if start < storedStart:
+                    end = max(end,storedEnd)
+                # no gap between the stored and the new prices, so they can be appended
+                if start > storedEnd + ONE_DAY:
+                    start = storedEnd + ONE_DAY
+
+            missingRanges = self._missingRanges(start,end)
+            if len(missingRanges) == 0:
+                return
+
+            rewrite = False
+            try:
+                storedFrames, downloadedFrames = self._fetch(missingRanges)
+                frames = [self._prices] + storedFrames + downloadedFrames
+            except _AdjustedPrices:
+                # all known prices are outdated, so they are downloaded again
+                # (also the stored ones, which are not loaded, so no stored history is lost)
+                for knownStart, knownEnd in [(self._start,self._end), self._storedRange or (None,None)]:
+                    if knownStart is not None:
+                        start, end = min(start,knownStart), max(end,knownEnd)
+                downloadedFrames = [self.download(start,end)]
+                frames = downloadedFrames
+                self._start, self._end = None, None
+                rewrite = True
+
+            frames = [frame for frame in frames if len(frame) > 0]
+            if (len(frames) == 1) and not rewrite:
+                # e.g. only stored prices: the views of the memory-mapped columns are kept without copying them
+                prices = frames[0]
+                self._storedViews = len(downloadedFrames) == 0
+            elif len(frames) > 0:
+                prices = pd.concat(frames)
+                # prices of the same date: the latest download is used (e.g. the prices of today)
+                prices = prices[~prices.index.duplicated(keep='last')].sort_index()
+                self._storedViews = False
+            else:
+                prices = self._prices
+            prices.index.name = 'Date'
+            self._prices = prices
+
+            self._start = start if self._start is None else min(start,self._start)
+            self._end = end if self._end is None else max(end,self._end)
+
+            # the store only needs to be written, if something was downloaded
+            if len(downloadedFrames) > 0:
+                self._savePrices(today,rewrite)
+
+
+    def _fetch(self,missingRanges):
+        """
+            Prices of the missing ranges as two lists of DataFrames: the stored dates, which are read from
+            the price store, and the other dates, which are downloaded. Raises _AdjustedPrices, if a known
+            trading day was adjusted in the meantime.
+        """
+        storedFrames = []
+        downloadRanges = []
+        for start, end in missingRanges:
+            if self._storedRange is None:
+                downloadRanges.append((start,end))
+                continue
+
+            storedStart, storedEnd = self._storedRange
+            if start < storedStart:
+                downloadRanges.append((start,min(end,storedStart-ONE_DAY)))
+            if (start <= storedEnd) and (end >= storedStart):
+                stored = self._readStored(max(start,storedStart),min(end,storedEnd))
+                if stored is None:
+                    # the store could not be read, so the prices are downloaded
+                    downloadRanges.append((max(start,storedStart),min(end,storedEnd)))
+                else:
+                    storedFrames.append(stored)
+            if end > storedEnd:
+                downloadRanges.append((max(start,storedEnd+ONE_DAY),end))
+
+        # known trading days next to the downloaded ranges
+        known = pd.concat([self._prices] + storedFrames)
+        if (self._storedRange is not None) and any([start > self._storedRange[1] for start, end in downloadRanges]):
+            lastStored = self._readStored(self._storedRange[1]-np.timedelta64(14,'D'),self._storedRange[1])
+            if lastStored is not None:
+                known = pd.concat([known,lastStored])
+        known = known[~known.index.duplicated(keep='last')].sort_index()
+
+        return storedFrames, [self._download(start,end,known) for start, end in downloadRanges]
+
+
+    def _download(self,start,end,known):
+        # downloads the prices from start to end together with the known trading days before and after the range
+        before = known.index[known.index < pd.Timestamp(start)]
+        after = known.index[known.index > pd.Timestamp(end)]
+        downloadStart = _toDay(before[-1]) if len(before) > 0 else start
+        downloadEnd = _toDay(after[0]) if len(after) > 0 else end
+        prices = self.download(downloadStart,downloadEnd)
+
+        overlap = prices.index.intersection(known.index)
+        if len(overlap) > 0:
+            downloaded = prices.loc[overlap,ADJUSTED_COLUMNS].values.astype('float64')
+            stored = known.loc[overlap,ADJUSTED_COLUMNS].values.astype('float64')
+            if not np.allclose(downloaded, stored, rtol=ADJUSTMENT_TOLERANCE, atol=0, equal_nan=True):
+                raise _AdjustedPrices()
+
+        return prices.loc[(prices.index >= pd.Timestamp(start)) & (prices.index <= pd.Timestamp(end))]
+
+
+    def _readStoredRange(self):
+        # range of dates of the prices of former runs
+        self._storedRangeRead = True
+        meta = self.store.readMeta(self.symbol)
+        if (meta is not None) and (meta['rows'] > 0):
+            self._storedRange = (np.datetime64(meta['start'],'D'), np.datetime64(meta['end'],'D'))
+
+
+    def _readStored(self,start,end):
+        # stored prices from start to end as DataFrame of the memory-mapped columns (None, if they can not be read)
+        data = self.store.read(self.symbol,start,end)
+        if data is None:
+            return None
+
+        index = pd.DatetimeIndex(data['Date'].astype('datetime64[ns]'), name='Date')
+        return DataFrame({column: data[column] for column in COLUMNS}, index=index, columns=COLUMNS, copy=False)
+
+
+    def _savePrices(self,today,rewrite=False):
+        # only the completed trading days are stored, because the prices of today can still change
+        end = min(self._end, today - ONE_DAY)
+        if end < self._start:
+            return
+
+        # the memory-mapped files can not be replaced or truncated, while they are mapped (e.g. on Windows)
+        if self._storedViews:
+            self._prices = self._prices.copy()
+            self._storedViews = False
+
+        completed = self._prices.loc[self._prices.index < pd.Timestamp(today)]
+        dates = completed.index.values.astype('datetime64[D]')
+        values = {column: completed[column].values for column in COLUMNS}
+
+        # the store is only a cache, so the analysis goes on, if it can not be written
+        try:
+            if rewrite or (self._storedRange is None) or (self._start < self._storedRange[0]):
+                # adjusted or earlier prices can not be appended, so all prices are written again
+                self.store.write(self.symbol,dates,values,self._start,end)
+                self._storedRange = (self._start,end)
+            else:
+                self.store.append(self.symbol,dates,values,end)
+                self._storedRange = (self._storedRange[0],max(self._storedRange[1],end))
+        except (OSError, ValueError) as e:
+            print(' +++ The prices of ' + self.symbol + ' could not be stored: ' + str(e) + ' +++ ')
+
+
+    def get(self,start,end=None,interval='1d'):
+        """
+            Prices from start to end (both included)
+            - start, end: date as str ('%Y-%m-%d'), datetime or numpy.datetime64. If end is None, today is used.
+            - interval: '1d', '1wk' or '1mo'
+        """
+        if (interval != '1d') and (interval not in RESAMPLE_RULES):
+            raise ValueError('The interval "' + str(interval) + '" is not supported. Supported intervals: 1d, ' + ', '.join(RESAMPLE_RULES))
+
+        self.load(start,end)
+
+        start = pd.Timestamp(_toDay(start))
+        prices = self._prices
+        if end is None:
+            prices = prices.loc[prices.index >= start]
+        else:
+            prices = prices.loc[(prices.index >= start) & (prices.index <= pd.Timestamp(_toDay(end)))]
+
+        if interval == '1d':
+            return prices.copy()
+        return self.resample(prices,interval)
+
+
+    def getPeriod(self,years=5,interval='1d'):
+        # prices of the last years until today
+        start = datetime.now() + relativedelta(years=-years)
+        return self.get(start,interval=interval)
+
+
+    @staticmethod
+    def resample(prices,interval):
+        # aggregation of the daily prices to weekly or monthly prices
+        rule = RESAMPLE_RULES[interval]
+        resampled = prices.resample(rule, label='left', closed='left').agg(AGGREGATION)
+        return resampled.dropna(subset=['Close'])
+
+
+    def __str__(self):
+        return '<PriceHistory ' + self.symbol + ' (' + str(len(self._prices)) + ' days)>'
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+from utils.generic import lastValuesOfYears
+from classes.GlobalVariables import *
+
+# Financial ratios as expressions over the rows of the financial statements
+#
+# Each ratio is declared as (numerator, denominator) with the labels of two rows of the
+# financial statements. All ratios are evaluated at once as array operations over all
+# periods: for one stock (rows x dates) or for many stocks (symbols x rows x years).
+# Missing rows or values result in NaN.
+
+NET_MARGIN = 'netMargin'
+RETURN_ON_EQUITY = 'returnOnEquity'
+RETURN_ON_ASSETS = 'returnOnAssets'
+FREE_CASH_FLOW_BY_SALES = 'freeCashFlowBySales'
+CURRENT_RATIO = 'currentRatio'
+ASSET_TURNOVER = 'assetTurnover'
+FINANCIAL_LEVERAGE = 'financialLeverage'
+GROSS_MARGIN = 'grossMargin'
+LONG_TERM_DEBT_TO_ASSETS = 'longTermDebtToAssets'
+
+RATIOS = {
+    NET_MARGIN: (NET_INCOME, REVENUES),
+    RETURN_ON_EQUITY: (NET_INCOME, STOCKHOLDERS_EQUITY),
+    RETURN_ON_ASSETS: (NET_INCOME, ASSETS),
+    FREE_CASH_FLOW_BY_SALES: (FREE_CASH_FLOW, REVENUES),
+    CURRENT_RATIO: ('Total Current Assets', 'Total Current Liabilities'),
+    ASSET_TURNOVER: (REVENUES, ASSETS),
+    FINANCIAL_LEVERAGE: (ASSETS, STOCKHOLDERS_EQUITY),
+    GROSS_MARGIN: ('Gross Profit', REVENUES),
+    LONG_TERM_DEBT_TO_ASSETS: ('Long Term Debt', ASSETS),
+}
+
+
+def statementRows(ratios=None):
+    # labels of all rows of the financial statements, which are needed for the ratios (without duplicates)
+    if ratios is None:
+        ratios = RATIOS
+    rows = []
+    for numerator, denominator in ratios.values():
+        for row in [numerator, denominator]:
+            if row not in rows:
+                rows.append(row)
+    return rows
+
+
+def evaluate(values,rows,ratios=None):
+    """
+        Values of all ratios in one computation
+        - values: array of shape (..., len(rows), n_periods) with the values of the statement rows
+        - rows: labels of the rows of values
+        Returns an array of shape (..., len(ratios), n_periods) in the order of the ratios.
+    """
+    if ratios is None:
+        ratios = RATIOS
+    values = np.asarray(values, dtype='float64')
+    position = {row: i for i, row in enumerate(rows)}
+    numerators = [position[numerator] for numerator, denominator in ratios.values()]
+    denominators = [position[denominator] for numerator, denominator in ratios.values()]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return values[...,numerators,:]/values[...,denominators,:]
+
+
+def evaluateStatements(statements,ratios=None):
+    """
+        Ratios of one stock as DataFrame (one row per ratio, one column per date of the statements,
+        latest date first)
+        - statements: financial statements of the stock (rows x dates)
+    """
+    if ratios is None:
+        ratios = RATIOS
+    rows = statementRows(ratios)
+    statements = statements.reindex(index=rows, columns=sorted(statements.columns, reverse=True))
+    values = statements.apply(pd.to_numeric, errors='coerce').values
+    return pd.DataFrame(evaluate(values,rows,ratios), index=list(ratios), columns=statements.columns)
+
+
+def panel(statementsBySymbol,rows):
+    """
+        Statement rows of many stocks aligned on the fiscal years
+        - statementsBySymbol: dict symbol -> financial statements (rows x dates)
+        Returns the symbols, the years (ascending) and an array of shape (symbols, rows, years).
+        If a stock has more than one date in a year, the values of the last date are used.
+    """
+    symbols = list(statementsBySymbol)
+    yearly = []
+    for symbol in symbols:
+        statements = statementsBySymbol[symbol].reindex(index=rows).apply(pd.to_numeric, errors='coerce')
+        yearly.append(lastValuesOfYears(statements.columns, statements.values))
+    years = np.unique(np.concatenate([stockYears for stockYears, stockValues in yearly])) if len(symbols) > 0 else np.array([], dtype=str)
+
+    values = np.full((len(symbols), len(rows), len(years)), np.nan)
+    for i, (stockYears, stockValues) in enumerate(yearly):
+        values[i][:,np.searchsorted(years,stockYears)] = stockValues
+
+    return symbols, years, values
+
+
+def evaluatePanel(statementsBySymbol,ratios=None):
+    """
+        Ratios of many stocks in one computation as DataFrame with the index (symbol, ratio)
+        and one column per fiscal year (ascending)
+        - statementsBySymbol: dict symbol -> financial statements (rows x dates)
+    """
+    if ratios is None:
+        ratios = RATIOS
+    rows = statementRows(ratios)
+    symbols, years, values = panel(statementsBySymbol,rows)
+
+    result = evaluate(values,rows,ratios).reshape(len(symbols)*len(ratios), len(years))
+    index = pd.MultiIndex.from_product([symbols, list(ratios)], names=['symbol', 'ratio'])
+    return pd.DataFrame(result, index=index, columns=years)
+
+
+def latestValues(ratioPanel):
+    """
+        Latest value (of the latest year with a value) of every ratio and symbol of a panel (see evaluatePanel)
+        as DataFrame with one row per symbol and one column per ratio
+    """
+    values = ratioPanel.values
+    if values.shape[1] == 0:
+        latest = np.full(values.shape[0], np.nan)
+    else:
+        # position of the last value, which is not NaN
+        hasValue = ~np.isnan(values)
+        last = values.shape[1] - 1 - np.argmax(hasValue[:,::-1], axis=1)
+        latest = np.where(hasValue.any(axis=1), values[np.arange(values.shape[0]),last], np.nan)
+    latest = pd.Series(latest, index=ratioPanel.index).unstack('ratio')
+    # unstack sorts the labels, the order of the panel is kept
+    return latest.reindex(index=ratioPanel.index.unique('symbol'), columns=ratioPanel.index.unique('ratio'))
@@ -3,15 +3,12 @@
 # ---------- MODULES ----------
 # standard modules
 import sys, os
+import asyncio
+import threading
 import numpy as np
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from pandas import DataFrame
-import pandas as pd
-import commentjson as json
 
-# 3rd party modules
-import yfinance as yf
+# 3rd party modules (yfinance and commentjson are imported, when they are needed for the first time)
 
 # custom modules
 currentFolder = os.path.dirname(os.path.abspath(__file__))
@@ -19,19 +16,15 @@ main_path = currentFolder.replace('classes','')
 if main_path not in sys.path:
     sys.path.append(main_path)
 
-from utils.yfinance_extension import loadExtraIncomeStatementData, load_CashFlow, load_KeyStatistics
-from utils.generic import mergeDataFrame, npDateTime64_2_str
-from classes.FinnhubAPI import FinnhubClient
+from utils.yfinance_extension import loadExtraIncomeStatementData, load_CashFlow, load_KeyStatistics, releasePageStores
+from utils.generic import mergeDataFrame
+from utils.timeseries import rebasePrices
+from classes.FinnhubAPI import getFinnhubClient
 from classes.FinancialDataManager import DataLoader
+from classes.PriceHistory import getPriceHistory
 
 # ---------- VARIABLES ----------
 
-# Einstellungen, damit Pandas DataFrames immer vollstaendig geplotted werden
-pd.set_option('display.max_rows', None)
-pd.set_option('display.max_columns', None)
-pd.set_option('display.width', None)
-pd.set_option('display.max_colwidth', None)
-
 # DEV-VARIABLES
 DEBUG = False
 
@@ -135,36 +128,87 @@ class Stock:
 
 
     def loadMainData(self):
+        # synchronous wrapper around the concurrent loading of all data
+        runCoroutine(self.loadMainDataAsync())
+
+
+    async def loadMainDataAsync(self):
+        # All independent requests are done concurrently, so the time needed to load
+        # the data is about the time of the slowest request instead of the sum of all requests.
+        loop = asyncio.get_running_loop()
+
+        def run(function,*args):
+            return loop.run_in_executor(None,function,*args)
+
+        # create the ticker and the data loader before the threads are started
+        # the data loader uses the ticker of the stock, so yfinance scrapes the pages only once
+        # for the info and the financial statements (see loadYahooData)
+        dataLoader = self.__DataLoader
+        dataLoader.YFinanceClient.Ticker = self.ticker
+
+        # the financial statements are only downloaded, if a newer fiscal period could have been published
+        storedFinancialStatements = dataLoader.getStoredFinancialStatements()
+
+        async def loadYahooData():
+            # the info and the yahoo financial statements are scraped from the same pages by the
+            # same yfinance ticker, so they are loaded one after the other and the pages are only loaded once
+            await run(self.getInfo)
+            if storedFinancialStatements is None:
+                return await run(dataLoader.getYahooFinancialStatements)
+
+        async def loadFinnhubData():
+            if storedFinancialStatements is None:
+                return await run(dataLoader.getFinnhubFinancialStatements)
+
+        tasks = [loadYahooData(), loadFinnhubData(), run(self.getRecommendations), run(self.getKeyStatistics), run(self.loadHistoricalData)]
+        if storedFinancialStatements is None:
+            # the pages are kept in memory, so they are not loaded again for the financial statements
+            tasks += [run(loadExtraIncomeStatementData,self.symbol), run(load_CashFlow,self.symbol)]
+
+        try:
+            yahooFinancialStatements, finnhubFinancialStatements = (await asyncio.gather(*tasks))[:2]
+        finally:
+            # the decoded pages are not needed anymore, so they do not stay in memory for the other stocks of a batch
+            releasePageStores(self.symbol)
+
+        # assemble the stock data
+        if storedFinancialStatements is None:
+            self._financialStatements = dataLoader.mergeFinancialStatements(finnhubFinancialStatements,yahooFinancialStatements)
+            dataLoader.storeFinancialStatements(self._financialStatements,finnhubFinancialStatements,yahooFinancialStatements)
+        else:
+            self._financialStatements = storedFinancialStatements
         self.getStockName()
         self.getBookValuePerShare()
         self.getCurrentStockValue()
         self.getEarningsPerShare()
         self.getDividend()
         self.getPriceEarnigsRatio()
-        self.loadFinancialStatements()
-        self.getRecommendations()
-        self.getKeyStatistics()
         #self.getEstimates()
 
-        # monthly historical data
-        self.historicalData = self.ticker.history(period="5y", interval = "1wk")
 
+    @property
+    def priceHistory(self):
+        return getPriceHistory(self.symbol)
 
-    def calcRelativeHistoricalData(self):
-        # take all absolute values and override them afterwards
-        self.historicalDataRelative = self.historicalData.loc[:,'Close'].copy()
 
-        firstDate = npDateTime64_2_str(self.historicalDataRelative.index.values[0])
-        firstValue = self.historicalDataRelative.loc[firstDate]
-        for row in self.historicalDataRelative.index.values:
-            date = npDateTime64_2_str(row)
-            self.historicalDataRelative.loc[date] = self.historicalDataRelative.loc[date]/firstValue*100      
+    def loadHistoricalData(self):
+        # weekly historical data
+        # the daily prices are kept by the price history, so later requests of shorter periods are not downloaded again
+        self.historicalData = self.priceHistory.getPeriod(years=5,interval='1wk')
+        return self.historicalData
+
+
+    def calcRelativeHistoricalData(self):
+        # adjusted closing prices relative to the first price in percent
+        self.historicalDataRelative = rebasePrices(self.historicalData.loc[:,'Adj Close']).rename('Close')
+        return self.historicalDataRelative
 
     @property
     def ticker(self):
         if self._ticker is not None:
             return self._ticker
         elif self.symbol is not None:
+            import yfinance as yf
             self._ticker = yf.Ticker(self.symbol)
             return self._ticker
         else:
@@ -172,6 +216,7 @@ class Stock:
 
     @ticker.setter
     def ticker(self,ticker):
+        import yfinance as yf
         if not isinstance(ticker,yf.Ticker):
             raise TypeError('The ticker "' + str(ticker) + '" is no instance of yfinance.Ticker')
         else:
@@ -206,7 +251,7 @@ class Stock:
     @property
     def peerGroup(self):
         if self._peerGroup is None:
-            self._peerGroup = FinnhubClient(self.symbol).getPeerGroup()
+            self._peerGroup = getFinnhubClient(self.symbol).getPeerGroup()
 
         return self._peerGroup
 
@@ -248,7 +293,7 @@ class Stock:
     @property
     def __DataLoader(self):
         if self._dataLoader is None:
-            self._dataLoader = DataLoader(self.symbol)
+            self._dataLoader = DataLoader(self.symbol,self.dates)
         return self._dataLoader
 
     @__DataLoader.setter
@@ -378,7 +423,7 @@ class Stock:
 
     
     def getEstimates(self):
-        epsEstimates = FinnhubClient(self.symbol).getEpsEstimates()
+        epsEstimates = getFinnhubClient(self.symbol).getEpsEstimates()
 
         df = DataFrame()
         for data in epsEstimates:
@@ -404,26 +449,17 @@ class Stock:
 
 
     def getRecommendations(self):
-        recommendations = FinnhubClient(self.symbol).getRecommendationsDataFrame()
+        recommendations = getFinnhubClient(self.symbol).getRecommendationsDataFrame()
         self.recommendations = recommendations
         return recommendations
 
 
     def getHistoricalStockPrice(self,startDate,endDate=None):
-
-        # Start date
-        start = datetime.strptime(startDate,Stock.DATE_FORMAT) + relativedelta(days=1)
-        startDate = start.strftime(Stock.DATE_FORMAT)
-
-        # End date
+        # daily prices from startDate to endDate (both included)
+        # if endDate is None, only the prices of startDate are returned
         if endDate is None:
-            end = start + relativedelta(days=1)
-        else:
-            end = datetime.strptime(endDate,Stock.DATE_FORMAT) + relativedelta(days=1)
-        endDate = end.strftime(Stock.DATE_FORMAT)
-
-        # Load data from yahoo finance
-        return yf.download(self.symbol,start=startDate,end=endDate)
+            endDate = startDate
+        return self.priceHistory.get(startDate,endDate)
 
 
     # Funktion zur Berechnung eines Gewichteten Mittelwerts
@@ -468,36 +504,81 @@ class StockIndex():
     def __init__(self,indexSymbol):
 
         self.symbol = indexSymbol
-        self.ticker = yf.Ticker(indexSymbol)
+        self._ticker = None
 
+        # the prices are loaded, when they are needed for the first time
         self.historicalData = None
+        self._lock = threading.Lock()
+
+    @property
+    def ticker(self):
+        if self._ticker is None:
+            import yfinance as yf
+            self._ticker = yf.Ticker(self.symbol)
+        return self._ticker
 
-        self.loadHistoricalData()
+    @property
+    def priceHistory(self):
+        return getPriceHistory(self.symbol)
 
     def loadHistoricalData(self,startDate=None,endDate=None):
 
         if (startDate is None) and (endDate is None):
-            return self.ticker.history(period="5y", interval = "1wk")
+            # weekly prices of the last 5 years (loaded once and shared by all stocks, which use the index)
+            with self._lock:
+                if self.historicalData is None:
+                    self.historicalData = self.priceHistory.getPeriod(years=5,interval='1wk')
+            return self.historicalData
         else:
             if (startDate is None) and (endDate is not None):
                 raise ValueError('Missing startDate. You passed endDate=' + str(endDate) + ' but no startDate')
             elif (startDate is not None) and (endDate is None):
-                end = datetime.strptime(startDate)+1
-                endDate = end.strftime(Stock.DATE_FORMAT)
-            
-            # add one day to start and end, to get the correct intervall
-            start = datetime.strptime(startDate,Stock.DATE_FORMAT) + relativedelta(days=1)
-            startDate = start.strftime(Stock.DATE_FORMAT)
-            end = datetime.strptime(endDate,Stock.DATE_FORMAT) + relativedelta(days=1)
-            endDate = end.strftime(Stock.DATE_FORMAT)
+                endDate = startDate
+
+            # daily prices from startDate to endDate (both included)
+            return self.priceHistory.get(startDate,endDate)
+
+
+
+
+# one index per symbol, shared by all stocks of the process
+_stockIndices = {}
+_stockIndicesLock = threading.Lock()
+
+def getStockIndex(indexSymbol):
+    with _stockIndicesLock:
+        if indexSymbol not in _stockIndices:
+            _stockIndices[indexSymbol] = StockIndex(indexSymbol)
+        return _stockIndices[indexSymbol]
+
+
+def runCoroutine(coroutine):
+    # runs the coroutine to completion and returns its result
+    # if an event loop is already running in this thread (e.g. jupyter), a separate thread is used
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
 
-            # load data from yahoo finance
-            return yf.download(self.symbol, start=startDate, end=endDate)
+    result = {}
+    def target():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            result['error'] = e
 
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
 
+    if 'error' in result:
+        raise result['error']
+    return result['value']
 
 
 def loadStockFile(stockName,stocksFile='scripts/data/stocks.json'):
+    # the stock files contain comments, so they are read with commentjson
+    import commentjson as json
 
     if not os.path.isfile(stocksFile):
         raise Exception('The file "' + stocksFile + '" does not exist. This file needs to contain the stock list.')
@@ -6,14 +6,15 @@ import pandas as pd
 
 import datetime
 from dateutil.relativedelta import relativedelta
-from sklearn.linear_model import LinearRegression
-import matplotlib.pyplot as plt
 
 # custom modules
-from classes.Stock import Stock, StockIndex
-from classes.FinnhubAPI import FinnhubClient
-from utils.generic import npDateTime64_2_str
-from utils.plot import createPlot
+from classes.Stock import Stock, StockIndex, getStockIndex
+from classes.FinnhubAPI import getFinnhubClient
+from classes.TradingCalendar import TradingCalendar
+from classes import DCF
+from classes import Ratios
+from utils.generic import npDateTime64_2_strArray
+from utils.trend import LinearTrend, LEAST_SQUARES
 from classes.GlobalVariables import *
 
 # ---------- CLASSES ----------
@@ -28,6 +29,13 @@ class StockAnalyzer():
     #
     useWeightedHistoricalData = False
     weightingStep = 1
+
+    # offsets of the assumptions for the sensitivity of the DCF method in percentage points
+    DCF_DISCOUNT_RATE_OFFSETS = [-2, -1, 0, 1, 2]
+    DCF_GROWTH_RATE_OFFSETS = [-4, -2, 0, 2, 4]
+
+    # method of the trend of the free cash flows for the DCF method ('least-squares' or 'theil-sen' for cash flows with outliers)
+    DCF_TREND_METHOD = LEAST_SQUARES
     
     def __init__(self,stock,index=None):
         if not isinstance(stock,Stock):
@@ -38,7 +46,7 @@ class StockAnalyzer():
         elif isinstance(index,StockIndex):
             self.stockIndex = index
         elif isinstance(index,str):
-            self.stockIndex = StockIndex(index)
+            self.stockIndex = getStockIndex(index)
         else:
             raise TypeError('The index needs to be a \'str\' or an object of StockIndex, but it is \'' + str(type(index)) + '.')
         
@@ -61,8 +69,11 @@ class StockAnalyzer():
         self._PriceToSales = None
         self._PriceToEarnings = None
         self._PresentShareValue = None
+        self._DCFSensitivity = None
+        self._DCFMonteCarlo = None
         self._CurrentRatio = None
         self._AssetTurnover = None
+        self._FinancialRatios = None
 
         self.dividendYield = 0
 
@@ -136,27 +147,35 @@ class StockAnalyzer():
             self.calcDCF()
         return self._PresentShareValue
 
+    @property
+    def DCFMonteCarlo(self):
+        if self._DCFMonteCarlo is None:
+            self.calcDCFMonteCarlo()
+        return self._DCFMonteCarlo
+
+    @property
+    def DCFSensitivity(self):
+        if self._DCFSensitivity is None:
+            self.calcDCFSensitivity()
+        return self._DCFSensitivity
+
+    @property
+    def FinancialRatios(self):
+        # all ratios of Ratios.RATIOS for every date of the financial statements (latest date first)
+        if self._FinancialRatios is None:
+            self.calcFinancialRatios()
+        return self._FinancialRatios
+
     @property
     def currentRatio(self):
         if self._CurrentRatio is None:
-            currentAssets = self.stock.financialStatements.loc['Total Current Assets'].copy()
-            currentLiabilities = self.stock.financialStatements.loc['Total Current Liabilities'].copy()
-            df = pd.Series()
-            for date in currentAssets.index.values:
-                df.loc[date] = currentAssets.loc[date]/currentLiabilities.loc[date]
-            self._CurrentRatio = df
+            self._CurrentRatio = self.FinancialRatios.loc[Ratios.CURRENT_RATIO]
         return self._CurrentRatio
 
     @property
     def assetTurnover(self):
         if self._AssetTurnover is None:
-            sales = self.stock.financialStatements.loc[REVENUES,:]
-            assets = self.stock.financialStatements.loc[ASSETS,:]
-            df = pd.Series()
-            for date in sales.index.values:
-                df.loc[date] = sales.loc[date]/assets.loc[date]
-
-            self._AssetTurnover = df
+            self._AssetTurnover = self.FinancialRatios.loc[Ratios.ASSET_TURNOVER]
         return self._AssetTurnover
 
     """
@@ -187,74 +206,58 @@ class StockAnalyzer():
             ('growth_year_10ff' in self.stock.assumptions.keys())
 
 
+    """
+        Startwert des Discounted Cash Flow Verfahrens
+    """
+    def calcDCFStartValue(self):
+        # Free Chashflow der letzten Jahre
+        CF = self.stock.financialStatements.loc['freeCashFlow',:].copy()
+
+        CF.fillna(CF.mean(), inplace=True) # TODO: NaN Werte werden durch Mittelwert ersetzt
+
+        # Sortierung in aufsteigender Reihenfolge (alt -> neu)
+        CF_sorted = []
+        years = []
+        for date in sorted(CF.index.values.copy()):
+            CF_sorted.append(CF.loc[date])
+            years.append(int(date[0:4]))
+
+        # Berechnung 
+        trend = LinearTrend.fit(np.arange(len(CF_sorted)),CF_sorted,method=self.DCF_TREND_METHOD)
+        todaysCashFlow_regression = trend.predict(len(CF_sorted)-1)
+        todaysCashFlow_thisYear = CF_sorted[-1]
+        FCFstartValue = (todaysCashFlow_regression+todaysCashFlow_thisYear)/2
+
+        return FCFstartValue, years, CF_sorted
+
+
     """
         Discounted Cash Flow Verfahren
     """
     def calcDCF(self,detailed=True,generatePlot=False):
         # check if all needed assumptions data is available
         if self.isAssumptionsCompleteForDCF():
-            # Free Chashflow der letzten Jahre
-            CF = self.stock.financialStatements.loc['freeCashFlow',:].copy()
-
-            CF.fillna(CF.mean(), inplace=True) # TODO: NaN Werte werden durch Mittelwert ersetzt
-
-            # Sortierung in aufsteigender Reihenfolge (alt -> neu)
-            CF_sorted = []
-            years = []
-            for date in sorted(CF.index.values.copy()):
-                CF_sorted.append(CF.loc[date])
-                years.append(int(date[0:4]))
-
-            # Berechnung 
-            model = linearRegression(range(len(CF_sorted)),CF_sorted,plotResult=False)
-            todaysCashFlow_regression = model.predict(np.array([len(CF_sorted)-1]).reshape(1, -1))[0]
-            todaysCashFlow_thisYear = CF_sorted[-1]
-            FCFstartValue = (todaysCashFlow_regression+todaysCashFlow_thisYear)/2
+            FCFstartValue, years, CF_sorted = self.calcDCFStartValue()
             if detailed:
                 print('DCF start value is the mean value of last years value and the regression value: {v:.2f} Mrd. {c}'.format(v=FCFstartValue/10**9,c=self.stock.currencySymbol))
                 print('-'*54)
                 print('  year | Free Cash Flow | discounted free cash flow')
                 print(' ' + '-'*52 + ' ')
             
-            # Wachstumsrate der naechsten 10 Jahre
+            # Free Cash Flow der naechsten 10 Jahre und insgesamt ab dem 11. Jahr (perpetuity value)
             discountRate = self.stock.assumptions["discountRate"]/100
-
-            # Free Cash Flow der naechsten 5 Jahre
-            growthRate = self.stock.assumptions['growth_year_1_to_5']/100
-            discountedCashFlow = []
-            FCF, year = [], []
-            for i in range(1,6):
-                FCF.append((FCFstartValue*(1+growthRate)**i))
-                discountedCashFlow.append(FCF[-1] / ((1 + discountRate)**i))
-                year.append(years[-1]+i)
-                if detailed:
-                    print('    {y:2.0f} | {fcf:6.2f} Mrd.    | {dfcf:6.2f} Mrd.'.format(y=i,fcf=FCF[-1]/10**9,dfcf=discountedCashFlow[-1]/10**9))
-
-            # Free Cash Flow der Jahre 6-10
-            growthRate = self.stock.assumptions['growth_year_6_to_10']/100
-            for i in range(6,11):
-                FCF.append((FCF[4]*(1+growthRate)**(i-5)))
-                discountedCashFlow.append(FCF[-1] / ((1 + discountRate)**i))
-                year.append(years[-1]+i)
-                if detailed:
-                    print('    {y:2.0f} | {fcf:6.2f} Mrd.    | {dfcf:6.2f} Mrd.'.format(y=i,fcf=FCF[-1]/10**9,dfcf=discountedCashFlow[-1]/10**9))
-
-            # Free Cash Flow insgesamt ab dem 11. Jahr (perpetuity value) im heutigen Wert (discounted perpetuity value)
-            # - FCF_10: Free Cash Flow in 10 Jahren
-            # - growthRate_10: Wachstum des Free Cash Flows nach dem 10. Jahr
-            # Formel: FCF_10 * (1 + growthRate_10) / ((discountRate - growthRate_10) * (1 + discountRate))
-            growthRate = self.stock.assumptions['growth_year_10ff']/100
-            # perpetuity value
-            FCF.append((FCF[-1] * (1 + growthRate)) / (discountRate - growthRate))
-            # discounted perpetuity value
-            discountedCashFlow.append(FCF[-1] / ((1 + discountRate)**10))
+            FCF, discountedCashFlow, perpetuityValue, discountedPerpetuityValue = DCF.presentValues(FCFstartValue, discountRate,
+                self.stock.assumptions['growth_year_1_to_5']/100, self.stock.assumptions['growth_year_6_to_10']/100, self.stock.assumptions['growth_year_10ff']/100)
+            year = [years[-1]+i for i in range(1,DCF.YEARS+1)]
 
             if detailed:
-                print('   inf | {fcf:6.2f} Mrd.    | {dfcf:6.2f} Mrd.'.format(y=i,fcf=FCF[-1]/10**9,dfcf=discountedCashFlow[-1]/10**9))
+                for i in range(DCF.YEARS):
+                    print('    {y:2.0f} | {fcf:6.2f} Mrd.    | {dfcf:6.2f} Mrd.'.format(y=i+1,fcf=FCF[i]/10**9,dfcf=discountedCashFlow[i]/10**9))
+                print('   inf | {fcf:6.2f} Mrd.    | {dfcf:6.2f} Mrd.'.format(fcf=perpetuityValue/10**9,dfcf=discountedPerpetuityValue/10**9))
                 print(' ' + '-'*52 + ' ')
 
             # Summe der, auf den aktuellen Zeitpunkt bezogenen, zukuenfitgen Cashflows
-            totalEquityValue = sum(discountedCashFlow)
+            totalEquityValue = discountedCashFlow.sum() + discountedPerpetuityValue
 
             # Wert einer Aktie zum aktuellen Zeitpunkt auf Grundlage aller zkünftigen Free Cash Flows
             # Beruecksichtigung einer Margin of safety
@@ -272,14 +275,78 @@ class StockAnalyzer():
             self._PresentShareValue = perShareValue
 
             if generatePlot:
-                createPlot([years,years[-1],year],[CF_sorted,FCFstartValue,FCF[:-1]],legend_list=['historical free cash flows','start value for DCF method','estimated free cash flows'])
+                from utils.plot import createPlot
+                createPlot([years,years[-1],year],[CF_sorted,FCFstartValue,list(FCF)],legend_list=['historical free cash flows','start value for DCF method','estimated free cash flows'])
         
-            return FCF
+            return list(FCF) + [perpetuityValue]
         else:
             print(' +++ Discounted Cash Flow Analysis failed due to missing data +++ ')
             return []
 
 
+    """
+        Sensitivitaet des Discounted Cash Flow Verfahrens
+    """
+    def calcDCFSensitivity(self,discountRates=None,growthRates=None,marginsOfSafety=None):
+        """
+            Value per share for all combinations of the assumptions (all rates in percent like the assumptions)
+            - discountRates: list of discount rates (default: assumption -2 ... +2)
+            - growthRates: list of (growth_year_1_to_5, growth_year_6_to_10, growth_year_10ff)
+              (default: assumptions with growth_year_1_to_5 -4 ... +4 and growth_year_6_to_10 -2 ... +2)
+            - marginsOfSafety: list of margins of safety (default: assumption)
+            Returns a DataFrame with one row per growth scenario and the columns (margin_of_safety, discountRate).
+            All values are calculated in one computation.
+        """
+        if not self.isAssumptionsCompleteForDCF():
+            print(' +++ Discounted Cash Flow Analysis failed due to missing data +++ ')
+            return None
+
+        assumptions = self.stock.assumptions
+        if discountRates is None:
+            discountRates = [assumptions['discountRate']+offset for offset in self.DCF_DISCOUNT_RATE_OFFSETS]
+        if growthRates is None:
+            growthRates = [(assumptions['growth_year_1_to_5']+offset, assumptions['growth_year_6_to_10']+offset/2, assumptions['growth_year_10ff']) for offset in self.DCF_GROWTH_RATE_OFFSETS]
+        if marginsOfSafety is None:
+            marginsOfSafety = [assumptions['margin_of_safety']]
+
+        FCFstartValue = self.calcDCFStartValue()[0]
+        sharesOutstanding = self.stock.keyStatistics[Stock.SHARES_OUTSTANDING]
+        values = DCF.sensitivityGrid(FCFstartValue, sharesOutstanding, np.asarray(discountRates)/100, np.asarray(growthRates)/100, np.asarray(marginsOfSafety)/100)
+
+        # values of shape (growth scenarios, margins of safety, discount rates) as table
+        values = np.transpose(values,(0,2,1)).reshape(len(growthRates),-1)
+        rows = ['/'.join(['{g:g}'.format(g=g) for g in growthRate]) for growthRate in growthRates]
+        columns = pd.MultiIndex.from_product([marginsOfSafety,discountRates], names=['margin_of_safety','discountRate'])
+        df = pd.DataFrame(values, index=pd.Index(rows, name='growth'), columns=columns)
+
+        self._DCFSensitivity = df
+        return df
+
+
+    """
+        Monte Carlo Simulation des Discounted Cash Flow Verfahrens
+    """
+    def calcDCFMonteCarlo(self,paths=100000,distributions=None,seed=None,percentiles=DCF.DEFAULT_PERCENTILES):
+        """
+            Percentiles of the value per share for randomly drawn assumptions (the assumptions of the stock are the centres)
+            - paths: number of simulated sets of assumptions
+            - distributions: dict with the distributions of the assumptions, e.g. {'discountRate': ('normal', 0.02)}
+              (widths as fractions, see DCF.DEFAULT_DISTRIBUTIONS)
+            Returns a dict percentile -> value per share.
+        """
+        if not self.isAssumptionsCompleteForDCF():
+            print(' +++ Discounted Cash Flow Analysis failed due to missing data +++ ')
+            return None
+
+        assumptions = {key: self.stock.assumptions[key]/100 for key in DCF.DEFAULT_DISTRIBUTIONS}
+        FCFstartValue = self.calcDCFStartValue()[0]
+        sharesOutstanding = self.stock.keyStatistics[Stock.SHARES_OUTSTANDING]
+
+        values = DCF.monteCarlo(FCFstartValue, sharesOutstanding, assumptions, paths=paths, distributions=distributions, seed=seed)
+        self._DCFMonteCarlo = DCF.percentiles(values,percentiles)
+        return self._DCFMonteCarlo
+
+
     """
         Berechnung des Levermann Scores
     """
@@ -322,12 +389,8 @@ class StockAnalyzer():
         
         # Verschuldungsgrad
         # Punkt wenn LongTerm-Debt/Assets kleiner als im Vorjahr
-        longTermDebt = self.stock.financialStatements.loc['Long Term Debt']
-        assets = self.stock.financialStatements.loc[ASSETS].copy()
-        ltd2a = []
-        for date in dates[-2:]:
-            ltd2a.append(longTermDebt.loc[date]/assets.loc[date])
-        if (ltd2a[-1] < ltd2a[-2]):
+        ltd2a = self.FinancialRatios.loc[Ratios.LONG_TERM_DEBT_TO_ASSETS]
+        if (ltd2a.loc[thisYear] < ltd2a.loc[previousYear]):
             score += 1
         
         # Liquidität 3. Grades
@@ -344,9 +407,8 @@ class StockAnalyzer():
 
         # Rohmarge
         # Punkt, wenn die Bruttomarge im Vergleich zum Vorjahr gewachsen ist
-        grossProfit = self.stock.financialStatements.loc['Gross Profit',:]
-        revenues = self.stock.financialStatements.loc[REVENUES,:]
-        if ((grossProfit.loc[thisYear]/revenues.loc[thisYear]) > (grossProfit.loc[previousYear]/revenues.loc[previousYear])):
+        grossMargin = self.FinancialRatios.loc[Ratios.GROSS_MARGIN]
+        if (grossMargin.loc[thisYear] > grossMargin.loc[previousYear]):
             score += 1
         
         # Kapitalumschlag
@@ -411,7 +473,7 @@ class StockAnalyzer():
 
 
     def loadRecommendations(self):
-        self._Recommendations = FinnhubClient(self.stock.symbol).getRecommendationsDataFrame()
+        self._Recommendations = getFinnhubClient(self.stock.symbol).getRecommendationsDataFrame()
 
 
     def getLatestRecommendations(self):
@@ -420,108 +482,45 @@ class StockAnalyzer():
         return latest
 
 
+    def calcFinancialRatios(self):
+        if self.stock.financialStatements is None:
+            raise Exception('The stock has no historical financial data. The financial ratios can not be calculated!')
+        # alle Kennzahlen in einem Schritt fuer alle Jahre
+        self._FinancialRatios = Ratios.evaluateStatements(self.stock.financialStatements)
+        return self._FinancialRatios
+
+
     """
         Berechnung des Nettogewinns
     """
     def calcNetMargin(self):
-        if self.stock.financialStatements is None:
-            raise Exception('The stock has no historical financial data. "Total Revenue" and "Net Income" needed!')
-        else:
-            # Nettogewinn
-            netIncome = self.stock.financialStatements.loc[NET_INCOME,:].copy()
-            # Umsatz
-            revenues = self.stock.financialStatements.loc[REVENUES,:].copy()
-
-            dic = {}
-            for index in sorted(netIncome.index, reverse=True):
-                dic[index] = netIncome.loc[index]/revenues.loc[index]
-
-            df = pd.Series(dic, index=dic.keys())
-            df.reindex(sorted(df.index, reverse=True))
-            self._NetMargin = df
-
-            return df
+        self._NetMargin = self.FinancialRatios.loc[Ratios.NET_MARGIN]
+        return self._NetMargin
 
 
     def calcReturnOnEquity(self):
-        if self.stock.financialStatements is None:
-            raise Exception('The stock has no historical financial data. "Total Stockholder Equity" and "Net Income" needed!')
-        else:
-            # Eigenkapital
-            equity = self.stock.financialStatements.loc[STOCKHOLDERS_EQUITY,:].copy()
-            # Betriebseinkommen
-            income = self.stock.financialStatements.loc[NET_INCOME,:].copy()
-
-            # Berechnung der Eigenkapitalrendite fuer jedes Jahr
-            dic = {}
-            for index in sorted(equity.index, reverse=True):
-                # ignore NAN-values
-                if (not np.isnan(income[index])) and (not np.isnan(equity[index])):
-                    dic[index] = income[index]/equity[index]
-
-            df = pd.Series(dic, index=dic.keys())
-            self._ReturnOnEquity = df
+        # Eigenkapitalrendite fuer jedes Jahr (ohne NaN-Werte)
+        self._ReturnOnEquity = self.FinancialRatios.loc[Ratios.RETURN_ON_EQUITY].dropna()
+        return self._ReturnOnEquity
 
-            return df
 
     def calcReturnOnAssets(self):
-        if self.stock.financialStatements is None:
-            raise Exception('The stock has no historical financial data. "Total Assets" and "Net Income" needed!')
-        else:
-            # Gesamtvermögen
-            totalAssets = self.stock.financialStatements.loc[ASSETS,:].copy()
-            # Betriebseinkommen
-            income = self.stock.financialStatements.loc[NET_INCOME,:].copy()
-
-            # Berechnung der Kapitalrendite fuer jedes Jahr
-            dic = {}
-            for index in sorted(totalAssets.index,reverse=True):
-                dic[index] = income[index]/totalAssets[index]
-
-            df = pd.Series(dic, index=dic.keys())
-            self._ReturnOnAssets = df
-
-            return df
+        # Kapitalrendite fuer jedes Jahr
+        self._ReturnOnAssets = self.FinancialRatios.loc[Ratios.RETURN_ON_ASSETS]
+        return self._ReturnOnAssets
 
 
     def calcFreeCashFlowBySales(self):
-        if self.stock.financialStatements is None:
-            raise Exception('The stock has no historical financial data. "Total Revenue" and "freeCashFlow" needed!')
-        else:
-            # Umsatz
-            revenues = self.stock.financialStatements.loc[REVENUES,:].copy()
-            # Free Cash Flow
-            freeCashFlow = self.stock.financialStatements.loc[FREE_CASH_FLOW,:].copy()
-            
-            # Berechnung des Free cash flows bezogen auf die Einnahmen fuer jedes Jahr
-            dic = {}
-            for index in sorted(revenues.index, reverse=True):
-                dic[index] = freeCashFlow[index]/revenues[index]
-
-            df = pd.Series(dic, index=dic.keys())
-            self._FreeCashFlowBySales = df
-
-            return df
+        # Free cash flow bezogen auf die Einnahmen fuer jedes Jahr
+        self._FreeCashFlowBySales = self.FinancialRatios.loc[Ratios.FREE_CASH_FLOW_BY_SALES]
+        return self._FreeCashFlowBySales
 
 
     def calcPriceToSales(self):
-        if self.stock.financialStatements is None:
-            raise Exception('The stock has no historical financial data. "Total Revenue" and "Total Stockholder Equity" needed!')
-        else:
-            # Umsatz
-            revenues = self.stock.financialStatements.loc[REVENUES,:].copy()
-            # Marktkapitalisierung
-            totalStockHolderEquity = self.stock.financialStatements.loc[STOCKHOLDERS_EQUITY,:].copy() 
-
-            # Price to Sales fuer jedes Jahr
-            P_S = pd.Series()
-            for date in list(revenues.index.values.copy()):
-                # Price/Sales
-                price = totalStockHolderEquity.loc[date]
-                sales = revenues.loc[date]
-                P_S.loc[date] = price/sales
-
-            self._PriceToSales
+        # Price to Sales: aktuelle Marktkapitalisierung bezogen auf den Umsatz jedes Jahres
+        revenues = self.stock.financialStatements.reindex(index=[REVENUES], columns=self.FinancialRatios.columns).iloc[0]
+        self._PriceToSales = (self.stock.keyStatistics[Stock.MARKET_CAP]/pd.to_numeric(revenues, errors='coerce')).rename('priceToSales')
+        return self._PriceToSales
 
 
     def calcGrowth(self,valueList,percentage=False):
@@ -537,7 +536,16 @@ class StockAnalyzer():
         cs = self.stock.currencySymbol
         xlabel = 'Jahr'
 
+        # matplotlib is only loaded, when a PDF is created
+        from classes.StockPDF import StockPDF
+
         pdf = StockPDF(pdfFileName=self.stock.symbol + '.pdf')
+
+        # years and values of all plotted rows of the financial statements, converted in one step
+        rows = [OPERATING_INCOME, NET_INCOME, CASH_FROM_OPERATING_ACTIVITIES, FREE_CASH_FLOW, DILUTED_AVERAGE_SHARES]
+        years, values = StockPDF.toYearArrays(self.stock.financialStatements.reindex(rows))
+        data = dict(zip(rows, values))
+
         pdf.newPage()
 
         """
@@ -545,63 +553,47 @@ class StockAnalyzer():
         """
         # Plot Operating Income
         ylabel = 'Income in Mrd. ' + cs
-        operatingIncome = self.stock.financialStatements.loc[OPERATING_INCOME].copy()/10**9
-        operatingIncome = operatingIncome.reindex(sorted(operatingIncome.index,reverse=True), axis=0)
-        pdf.addPlot(1,operatingIncome, title='Income', xlabel=xlabel, ylabel=ylabel, line=False, label="Operating Income")
+        operatingIncome = data[OPERATING_INCOME]/10**9
+        pdf.addArrays(1,years,operatingIncome, title='Income', xlabel=xlabel, ylabel=ylabel, line=False, label="Operating Income")
         
         # Regressionsrechnung Operating Income
         if not np.any(np.isnan(operatingIncome)):
-            series = self.__interpolate(operatingIncome)
-            pdf.addPlot(1,series, title='Income', xlabel=xlabel, ylabel=ylabel, line=True, label="Operating Income (lin. Regression)")
+            pdf.addArrays(1,years,self.__interpolate(years,operatingIncome), title='Income', xlabel=xlabel, ylabel=ylabel, line=True, label="Operating Income (lin. Regression)")
 
         # Net Income
-        netIncome = self.stock.financialStatements.loc[NET_INCOME].copy()/10**9
-        netIncome = netIncome.reindex(sorted(netIncome.index,reverse=True), axis=0)
-        pdf.addPlot(1,netIncome,title='Income',xlabel=xlabel,ylabel=ylabel, line=False, label="Net Income")
+        pdf.addArrays(1,years,data[NET_INCOME]/10**9,title='Income',xlabel=xlabel,ylabel=ylabel, line=False, label="Net Income")
 
         """
             Plot 2
         """
         # Cash flow from operating activities
         ylabel = 'Cash flow in Mrd. ' + cs
-        totalCashFlowFromOperations = self.stock.financialStatements.loc[CASH_FROM_OPERATING_ACTIVITIES].copy()/10**9
-        totalCashFlowFromOperations = totalCashFlowFromOperations.reindex(sorted(totalCashFlowFromOperations.index,reverse=True), axis=0)
-        pdf.addPlot(2,totalCashFlowFromOperations,title='Cash flow',xlabel=xlabel,ylabel=ylabel, line=False, label="Cash Flow from operating activities")
+        totalCashFlowFromOperations = data[CASH_FROM_OPERATING_ACTIVITIES]/10**9
+        pdf.addArrays(2,years,totalCashFlowFromOperations,title='Cash flow',xlabel=xlabel,ylabel=ylabel, line=False, label="Cash Flow from operating activities")
 
         # Regressionsrechnung
         if not np.any(np.isnan(totalCashFlowFromOperations)):
-            series = self.__interpolate(totalCashFlowFromOperations)
-            pdf.addPlot(2,series,title='Cash flow',xlabel=xlabel,ylabel=ylabel, line=True, label="Cash Flow from operating activities (lin. Regression)")
+            pdf.addArrays(2,years,self.__interpolate(years,totalCashFlowFromOperations),title='Cash flow',xlabel=xlabel,ylabel=ylabel, line=True, label="Cash Flow from operating activities (lin. Regression)")
 
         # Free cash flow
-        freeCashFlow = self.stock.financialStatements.loc[FREE_CASH_FLOW].copy()/10**9
-        freeCashFlow = freeCashFlow.reindex(sorted(freeCashFlow.index,reverse=True), axis=0)
-        pdf.addPlot(2,freeCashFlow,title='Cash flow',xlabel=xlabel,ylabel=ylabel, line=False, label="Free Cash Flow")
+        pdf.addArrays(2,years,data[FREE_CASH_FLOW]/10**9,title='Cash flow',xlabel=xlabel,ylabel=ylabel, line=False, label="Free Cash Flow")
 
         """
             Plot 3
         """
-        # Return on Equity
+        # Return on Equity and Return on Assets (aligned on the dates of both)
         ylabel = 'in %'
-        ROE = self.ReturnOnEquity*100
-        ROA = self.ReturnOnAssets*100
-        dates = sorted(list(set(list(ROE.index)+list(ROA.index))),reverse=True)
-        ROE = ROE.reindex(dates, axis=0)
-        pdf.addPlot(3,ROE,xlabel=xlabel,ylabel=ylabel, line=False, label='Return on Equity')
-
-        # Return on Assets
-        
-        ROA = ROA.reindex(dates, axis=0)
-        pdf.addPlot(3,ROA,xlabel=xlabel,ylabel=ylabel, line=False, label='Return on Assets')
+        returns = pd.concat([self.ReturnOnEquity, self.ReturnOnAssets], axis=1).T*100
+        returnYears, (ROE, ROA) = StockPDF.toYearArrays(returns)
+        pdf.addArrays(3,returnYears,ROE,xlabel=xlabel,ylabel=ylabel, line=False, label='Return on Equity')
+        pdf.addArrays(3,returnYears,ROA,xlabel=xlabel,ylabel=ylabel, line=False, label='Return on Assets')
 
         """
             Plot 4
         """
         # Number of Shares
         ylabel = 'Diluted number in Mio.'
-        averageShares = self.stock.financialStatements.loc[DILUTED_AVERAGE_SHARES].copy()/10**6
-        averageShares = averageShares.reindex(sorted(averageShares.index,reverse=True), axis=0)
-        pdf.addPlot(4,averageShares, xlabel=xlabel, ylabel=ylabel, title='Number of shares outstanding', line=False)
+        pdf.addArrays(4,years,data[DILUTED_AVERAGE_SHARES]/10**6, xlabel=xlabel, ylabel=ylabel, title='Number of shares outstanding', line=False)
 
 
         """
@@ -613,24 +605,25 @@ class StockAnalyzer():
             Plot 1
         """
         ylabel = ''
-        equity = self.stock.financialStatements.loc[STOCKHOLDERS_EQUITY].copy()
-        assets = self.stock.financialStatements.loc[ASSETS].copy()
-        series = pd.Series()
-        for date in sorted(equity.index.values, reverse=True):
-            series.loc[date] = assets.loc[date]/equity.loc[date]
-        pdf.addPlot(1,series, xlabel=xlabel, ylabel=ylabel, title='Financial Leverage', line=False)
+        pdf.addPlot(1,self.FinancialRatios.loc[Ratios.FINANCIAL_LEVERAGE], xlabel=xlabel, ylabel=ylabel, title='Financial Leverage', line=False)
+
+        """
+            New page: sensitivity of the DCF method
+        """
+        if self.DCFSensitivity is not None:
+            pdf.newPage()
+            marginOfSafety = self.stock.assumptions['margin_of_safety']
+            values = self.DCFSensitivity.xs(marginOfSafety, axis=1, level='margin_of_safety')
+            pdf.addHeatmap(1, values, xlabel='Discount rate in %', ylabel='Growth rates in % (years 1-5/6-10/10ff)',
+                title='DCF value per share in ' + cs + ' (margin of safety: {m:g}%)'.format(m=marginOfSafety))
         
         pdf.closePDF()
 
 
-    def __interpolate(self,dataSeries):
-        # Regressionsrechnung Operating Income
-        years = [float(y[0:4]) for y in dataSeries.index.values]
-        lr = linearRegression(years,dataSeries.values)
-        series = pd.Series()
-        for y in dataSeries.index.values:
-            series.loc[y] = lr.predict(np.array([float(y[0:4])]).reshape(1, -1))
-        return series
+    def __interpolate(self,years,values):
+        # Regressionsrechnung (years as labels, e.g. '2020')
+        years = np.asarray(years, dtype='float64')
+        return LinearTrend.fit(years,values).predict(years)
 
 
     def printBasicAnalysis(self):
@@ -805,7 +798,7 @@ class StockAnalyzer():
         else:
             if (avgLeverage > 3.5):
                 strLeverageComment = ' '*6 + 'hohe Leverage (> 3.5) --> ACHTUNG!'
-            elif (avgLeverage > 2.5) and (model.coef_/avgLeverage > 0.2):
+            elif (avgLeverage > 2.5) and (model.slope/avgLeverage > 0.2):
                 strLeverageComment = ' '*6 + 'Leverage steigt schnell an --> ACHTUNG!'
             else:
                 strLeverageComment = ' '*6 + 'Leverage ok'
@@ -1187,26 +1180,28 @@ class LevermannScore():
         #
         # Mittelwert Analystenmeinung (Kaufen=1, Halten=2, Verkaufen=3)
         analystRecommendations = self.stock.getRecommendations()
-        # Datum (Index) absteigend sortieren
-        analystRecommendations.reindex(sorted(analystRecommendations.index,reverse=True), axis=0)
-        newestRecommendations = analystRecommendations.iloc[0,:]
-        # Auslesen der Meinungen 
-        recommendationsBuy = newestRecommendations.loc['strongBuy'] + newestRecommendations.loc['buy']
-        recommendationsHold = newestRecommendations.loc['hold']
-        recommendationsSell = newestRecommendations.loc['sell'] + newestRecommendations.loc['strongSell']
-
-        # Anzahl aller Analystenmeinungen
-        numRecommendations = recommendationsBuy + recommendationsHold + recommendationsSell
-
-        # Bewertung Kaufen=1, Halten=2, Verkaufen=3
-        avgRecScore = (recommendationsBuy*1 + recommendationsHold*2 + recommendationsSell*3)/numRecommendations
-        self.recommendations = avgRecScore
-
-        # 2,5 < Mittelwert -> +1, 1,5 < Mittelwert < 2,5 -> 0, Mittelwert < 1,5 -> -1
-        if (avgRecScore >= 2.5):
-            LevermannScore += 1
-        elif (avgRecScore <= 1.5):
-            LevermannScore -= 1
+        # fehlende Analystenmeinungen (z.B. fehlgeschlagene Anfrage an Finnhub) werden nicht bewertet
+        if len(analystRecommendations) > 0:
+            # Datum (Index) absteigend sortieren
+            analystRecommendations.reindex(sorted(analystRecommendations.index,reverse=True), axis=0)
+            newestRecommendations = analystRecommendations.iloc[0,:]
+            # Auslesen der Meinungen 
+            recommendationsBuy = newestRecommendations.loc['strongBuy'] + newestRecommendations.loc['buy']
+            recommendationsHold = newestRecommendations.loc['hold']
+            recommendationsSell = newestRecommendations.loc['sell'] + newestRecommendations.loc['strongSell']
+
+            # Anzahl aller Analystenmeinungen
+            numRecommendations = recommendationsBuy + recommendationsHold + recommendationsSell
+
+            # Bewertung Kaufen=1, Halten=2, Verkaufen=3
+            avgRecScore = (recommendationsBuy*1 + recommendationsHold*2 + recommendationsSell*3)/numRecommendations
+            self.recommendations = avgRecScore
+
+            # 2,5 < Mittelwert -> +1, 1,5 < Mittelwert < 2,5 -> 0, Mittelwert < 1,5 -> -1
+            if (avgRecScore >= 2.5):
+                LevermannScore += 1
+            elif (avgRecScore <= 1.5):
+                LevermannScore -= 1
 
         # Reaktion auf Quartalszahlen
 
@@ -1219,21 +1214,36 @@ class LevermannScore():
         stock_1y_ago = self.stock.getHistoricalStockPrice(startDate=date_1y_ago_str,endDate=today.strftime(Stock.DATE_FORMAT))
         index_1y_ago = self.stockIndex.loadHistoricalData(startDate=date_1y_ago_str,endDate=today.strftime(Stock.DATE_FORMAT))
 
+        # trading days of the stock, all dates are looked up by binary search
+        calendar = TradingCalendar.fromPrices(stock_1y_ago)
+
+        # Zeitpunkte fuer den Kursverlauf und den Reversaleffekt
+        date_6m_ago = today + relativedelta(months=-6)
+        date_3m_ago = today + relativedelta(months=-3)
+        date_2m_ago = today + relativedelta(months=-2)
+        date_1m_ago = today + relativedelta(months=-1)
+
+        # naechstgelegene Handelstage fuer alle Zeitpunkte auf einmal
+        nearestDates = npDateTime64_2_strArray(calendar.nearest([date_1y_ago,date_6m_ago,date_3m_ago,date_2m_ago,date_1m_ago,today]))
+        date_1y_ago_nearest, date_6m_ago_nearest = nearestDates[0], nearestDates[1]
+        dates_3m_nearest = nearestDates[2:]
+
         # 
         if (self.stock.dates is not None) and ("quarterlyReports" in self.stock.dates):
             # get latest date of quarterly reports of the past
             quarterlyReportDates = [qrd["date"] for qrd in self.stock.dates["quarterlyReports"] if qrd["date"] < today.strftime(Stock.DATE_FORMAT)]
             lastquarterlyReportDate = sorted(quarterlyReportDates,reverse=True)[0]
-            date_quarterlyReport_nearest = findNearestDate(lastquarterlyReportDate,npDateTime64_2_str(stock_1y_ago.index.values.copy()))
+            position_quarterlyReport = calendar.nearestPosition(lastquarterlyReportDate)
+            date_quarterlyReport_nearest = str(calendar.dates[position_quarterlyReport])
 
             # Eröffnungskurs Aktie und Index am Tag der Veröffentlichung der Quartalszahlen
             stockOpen1 = stock_1y_ago.loc[date_quarterlyReport_nearest,'Open']
             indexOpen1 = index_1y_ago.loc[date_quarterlyReport_nearest,'Open']
 
             # Eroeffnungskurs am nächsten Handelstag
-            nextDateIndex = npDateTime64_2_str(stock_1y_ago.index.values.copy()).index(date_quarterlyReport_nearest)+1
-            stockOpen2 = stock_1y_ago.iloc[nextDateIndex].loc['Open']
-            indexOpen2 = index_1y_ago.iloc[nextDateIndex].loc['Open']
+            nextDate = str(calendar.dates[position_quarterlyReport+1])
+            stockOpen2 = stock_1y_ago.loc[nextDate,'Open']
+            indexOpen2 = index_1y_ago.loc[nextDate,'Open']
 
             # Änderung in %
             stockChange = stockOpen2/stockOpen1-1
@@ -1259,7 +1269,6 @@ class LevermannScore():
         # Kurs heute
         stockPrice_today = self.stock.getBasicDataItem(self.stock.MARKET_PRICE)
         # Kurs vor einem Jahr
-        date_1y_ago_nearest = findNearestDate(date_1y_ago,npDateTime64_2_str(stock_1y_ago.index.values.copy()))
         price_1y_ago = stock_1y_ago.loc[date_1y_ago_nearest,'Close']
         
         
@@ -1276,8 +1285,6 @@ class LevermannScore():
         
         # Kursverlauf der letzten 6 Monate
         # historischer Wert vor 6 Monaten
-        date_6m_ago = today + relativedelta(months=-6)
-        date_6m_ago_nearest = findNearestDate(date_6m_ago,npDateTime64_2_str(stock_1y_ago.index.values.copy()))
         price_6m_ago = stock_1y_ago.loc[date_6m_ago_nearest,'Close']
         relativeChangePrc_6m = (stockPrice_today/price_6m_ago-1)*100
         self.sharePriceRelative_6m = relativeChangePrc_6m
@@ -1303,25 +1310,9 @@ class LevermannScore():
 
         # Reversaleffekt der letzten drei Monate
         # Vergleich der Aktienperformance mit der Performance des Index
-        date_4m_ago = today + relativedelta(months=-4)
-        date_3m_ago = today + relativedelta(months=-3)
-        date_2m_ago = today + relativedelta(months=-2)
-        date_1m_ago = today + relativedelta(months=-1)
-        
-
-        # Performance der Aktie
-        stockPrices_3m, indexPrices_3m = [], []
-        dateList = npDateTime64_2_str(stock_1y_ago.index.values)
-        for date in [date_3m_ago,date_2m_ago,date_1m_ago,today]:
-            # finden eines passenden Datums
-            date_str = date.strftime(Stock.DATE_FORMAT)
-            if date_str in dateList:
-                stockPrices_3m.append(stock_1y_ago.loc[date_str,'Close'])
-                indexPrices_3m.append(index_1y_ago.loc[date_str,'Close'])
-            else:
-                nearestDate = findNearestDate(date,dateList)
-                stockPrices_3m.append(stock_1y_ago.loc[nearestDate,'Close'])
-                indexPrices_3m.append(index_1y_ago.loc[nearestDate,'Close'])
+        # (Kurse vor 3, 2 und 1 Monat und heute)
+        stockPrices_3m = [stock_1y_ago.loc[date,'Close'] for date in dates_3m_nearest]
+        indexPrices_3m = [index_1y_ago.loc[date,'Close'] for date in dates_3m_nearest]
 
         # Performance der Aktie
         stockPerformanceRelative = [(stockPrices_3m[i]/stockPrices_3m[i-1]-1)*100 for i in range(1,len(stockPrices_3m))]
@@ -1483,60 +1474,42 @@ def findNearestDate(date,datesList,dateFormat=Stock.DATE_FORMAT):
         im Argument datetime_object hat
         - datetime_object: Objekt der Klasse datetime.datetime
         - datesList: list mit allen Datums als Strings im Format des Arguments dateFormat
+        Fuer mehrere Abfragen sollte direkt ein TradingCalendar verwendet werden.
     """
-
-    # Finden eines passenden Datums
     if isinstance(date,str):
-        date_str = date
-        datetime_object = datetime.datetime.strptime(date,dateFormat)
-    elif isinstance(date,datetime.datetime):
-        datetime_object = date
-        date_str = date.strftime(dateFormat)
-    else:
-        raise ValueError('Argument of type ' + type(date) + ' is not supported.')
-
-    if date_str in datesList:
-        return date_str
-    else:
-        # 100 Versuche, um ein anderes Datum in der Naehe zu finden
-        for i in range(1,100):
-            newDate = datetime_object + relativedelta(days=1*i)
-            newDate_str = newDate.strftime(dateFormat)
-            if newDate_str in datesList:
-                return newDate_str
-
-            newDate_reverse = datetime_object + relativedelta(days=-1*i)
-            newDate_reverse_str = newDate_reverse.strftime(dateFormat)
-            if newDate_reverse_str in datesList:
-                return newDate_reverse_str
-
-    # Wenn nichts gefunden wurde, dann wird ein leerer String zurueckgegeben
-    return ''
+        date = datetime.datetime.strptime(date,dateFormat)
+    elif not isinstance(date,datetime.datetime):
+        raise ValueError('Argument of type ' + str(type(date)) + ' is not supported.')
 
+    if len(datesList) == 0:
+        return ''
 
-def linearRegression(x,y,plotResult=False):
+    calendar = TradingCalendar([datetime.datetime.strptime(d,dateFormat) for d in datesList])
+    nearestDate = calendar.nearest(date)
 
-    if not isinstance(x,np.ndarray):
-        x_data = np.array(x).reshape((-1, 1))
-    else:
-        x_data = x
+    # Wenn nichts in der Naehe (100 Tage) gefunden wurde, dann wird ein leerer String zurueckgegeben
+    if abs((nearestDate - np.datetime64(date.date())).astype(int)) >= 100:
+        return ''
+    return nearestDate.astype(datetime.datetime).strftime(dateFormat)
 
-    if not isinstance(y,np.ndarray):
-        y_data = np.array(y)
-    else:
-        y_data = y
+
+def linearRegression(x,y,plotResult=False):
+
+    x_data = np.asarray(x, dtype='float64').reshape(-1)
+    y_data = np.asarray(y, dtype='float64')
 
     # Fit the model
-    model = LinearRegression(fit_intercept=True,copy_X=True).fit(x_data, y_data)
+    model = LinearTrend.fit(x_data, y_data)
 
     if plotResult:
         r_sq = model.score(x_data, y_data)
         print('coefficient of determination:', r_sq)
 
-        print('intercept:', model.intercept_)
-        print('slope:', model.coef_)
+        print('intercept:', model.intercept)
+        print('slope:', model.slope)
 
         # create a plot
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
         ax.plot(x_data,y_data, linestyle = 'None', marker='o', label='Data')
         ax.plot(x_data,model.predict(x_data), label='Linear Regression')
@@ -1545,119 +1518,3 @@ def linearRegression(x,y,plotResult=False):
         plt.show()
 
     return model
-
-
-
-from matplotlib.backends.backend_pdf import PdfPages, PdfFile
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib as mpl
-
-class StockPDF():
-
-    # size in pt
-    FONTSIZE = 10
-
-    # default figure size in inches
-    # DIN A4
-    FIGURE_WIDTH = 29.7/2.54
-    FIGURE_HEIGHT = 21.0/2.54
-
-    __FONTSIZE_FACTOR_LEGEND = 0.8
-
-    def __init__(self,pdfFileName=None):
-
-        self.initVars()
-
-        # set filename of the PDF
-        if pdfFileName is not None:
-            self.filename = pdfFileName
-        else:
-            self.filename = 'unknown_' + datetime.datetime.utcnow().strftime('%Y_%m_%d_%H_%M_%S') + '.pdf'
-
-        self._pdf = PdfPages(self.filename)
-        
-
-    def initVars(self):
-        self._filename = None
-        self._pdf = None
-        self._colormap = plt.get_cmap('tab10')
-        self._fig = None
-        self._axes = None
-
-
-    @property
-    def filename(self):
-        return self._filename
-
-    @filename.setter
-    def filename(self,filename):
-        self._filename = filename
-
-    def newPage(self):
-
-        if self._fig is not None:
-            self.__closeFigure()
-
-        # add a plot
-        self._fig, self._axes = plt.subplots(ncols=2, nrows=2)
-
-        # linewidth for the axes
-        mpl.rcParams['axes.linewidth'] = 0.7
-
-        # labels are 70% of the fontsize
-        mpl.rcParams['xtick.labelsize'] = int(self.FONTSIZE*self.__FONTSIZE_FACTOR_LEGEND)
-        mpl.rcParams['ytick.labelsize'] = int(self.FONTSIZE*self.__FONTSIZE_FACTOR_LEGEND)
-
-
-    def addPlot(self,plotnumber,data,legendPos='upper left',xlabel='Date',ylabel='value',title='',line=True, label=None):
-
-        if plotnumber <= len(self._axes[0]):
-            ax = self._axes[0][plotnumber-1]
-        else:
-            ax = self._axes[(plotnumber-1)//len(self._axes[0])][plotnumber%len(self._axes[0])-1]
-
-        dataSeries = pd.Series()
-        for index in reversed(data.index.values):
-            dataSeries.loc[datetime.datetime.strftime(datetime.datetime.strptime(index,'%Y-%m-%d'),'%Y')] = data.loc[index]
-
-        #print(dataSeries)
-
-        if not line:
-            if label is None:
-                ax.plot(dataSeries, marker='.', linestyle="None", markersize=10)
-            else: 
-                ax.plot(dataSeries, marker='.', linestyle="None", markersize=10, label=label)
-        else:
-            if label is None:
-                ax.plot(dataSeries)
-            else:
-                ax.plot(dataSeries, label=label)
-
-        if label is not None:
-            ax.legend(loc='best', prop={'size': int(self.FONTSIZE*self.__FONTSIZE_FACTOR_LEGEND)})
-
-        ax.grid(True)
-
-        ax.set_xlabel(xlabel)
-        ax.set_ylabel(ylabel)
-        ax.set_title(title)
-
-
-    def __closeFigure(self):
-        self._fig = plt.gcf()
-        self._fig.set_size_inches(self.FIGURE_WIDTH, self.FIGURE_HEIGHT)
-        self._fig.tight_layout(pad=3)
-        self._pdf.savefig()
-        self._fig.clf()
-
-
-    def closePDF(self):
-
-        self.__closeFigure()
-
-        try:
-            self._pdf.close()
-            print(self.filename + ' wurde erstellt!')
-        except:
-            print(self.filename + ' konnte nicht erstellt werden')
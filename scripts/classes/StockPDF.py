@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# PDF report of the stock analysis
+# matplotlib is only imported with this module, so the analysis on the console does not need it
+#
+# The figures are created with the object-oriented interface of matplotlib (Figure with the Agg
+# canvas, saved by the PDF backend) instead of pyplot. There is no global state (no current
+# figure, no changes of the rcParams), so reports can be rendered in parallel threads or worker
+# processes. The figure of a page and its axes are created once with a fixed layout and reused
+# for all pages and reports of the process.
+
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+
+from utils.generic import lastValuesOfYears
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+
+
+class _PageTemplate():
+    # figure with a grid of axes at fixed positions, which is cleared for every new page
+
+    def __init__(self,width,height,nrows,ncols,layout):
+        self.figure = Figure(figsize=(width,height))
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(nrows=nrows, ncols=ncols, squeeze=False)
+        self.layout = dict(layout)
+        self.figure.subplots_adjust(**layout)
+
+    def reset(self,axesLineWidth,tickLabelSize):
+        for ax in self.axes.flat:
+            ax.cla()
+            for spine in ax.spines.values():
+                spine.set_linewidth(axesLineWidth)
+            ax.tick_params(labelsize=tickLabelSize)
+
+
+# templates, which are not used by a report at the moment
+_templates = []
+_templatesLock = threading.Lock()
+
+def _acquireTemplate(width,height,nrows,ncols,layout):
+    with _templatesLock:
+        for template in _templates:
+            if (template.figure.get_size_inches() == (width,height)).all() and (template.axes.shape == (nrows,ncols)) and (template.layout == layout):
+                _templates.remove(template)
+                return template
+    return _PageTemplate(width,height,nrows,ncols,layout)
+
+def _releaseTemplate(template):
+    with _templatesLock:
+        _templates.append(template)
+
+
+class StockPDF():
+
+    # size in pt
+    FONTSIZE = 10
+
+    # default figure size in inches
+    # DIN A4
+    FIGURE_WIDTH = 29.7/2.54
+    FIGURE_HEIGHT = 21.0/2.54
+
+    __FONTSIZE_FACTOR_LEGEND = 0.8
+
+    # linewidth for the axes
+    AXES_LINEWIDTH = 0.7
+
+    # grid of the plots on a page and their positions (fractions of the page)
+    NROWS = 2
+    NCOLS = 2
+    LAYOUT = {'left': 0.07, 'right': 0.95, 'bottom': 0.08, 'top': 0.94, 'wspace': 0.3, 'hspace': 0.35}
+
+    def __init__(self,pdfFileName=None):
+
+        self.initVars()
+
+        # set filename of the PDF
+        if pdfFileName is not None:
+            self.filename = pdfFileName
+        else:
+            self.filename = 'unknown_' + datetime.datetime.utcnow().strftime('%Y_%m_%d_%H_%M_%S') + '.pdf'
+
+        self._pdf = PdfPages(self.filename)
+        
+
+    def initVars(self):
+        self._filename = None
+        self._pdf = None
+        self._template = None
+        self._fig = None
+        self._axes = None
+
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self,filename):
+        self._filename = filename
+
+    def newPage(self):
+
+        if self._fig is not None:
+            self.__closeFigure()
+
+        if self._template is None:
+            self._template = _acquireTemplate(self.FIGURE_WIDTH, self.FIGURE_HEIGHT, self.NROWS, self.NCOLS, self.LAYOUT)
+
+        # empty page; tick labels are 80% of the fontsize
+        self._template.reset(self.AXES_LINEWIDTH, int(self.FONTSIZE*self.__FONTSIZE_FACTOR_LEGEND))
+        self._fig, self._axes = self._template.figure, self._template.axes
+
+
+    def __getAxes(self,plotnumber):
+        if plotnumber <= len(self._axes[0]):
+            return self._axes[0][plotnumber-1]
+        else:
+            return self._axes[(plotnumber-1)//len(self._axes[0])][plotnumber%len(self._axes[0])-1]
+
+
+    @staticmethod
+    def toYearArrays(data):
+        """
+            Years (as labels) and values in ascending order of the dates in one step
+            - data: Series with dates ('%Y-%m-%d') as index or DataFrame with dates as columns (one row per series)
+            Returns the array of the years and an array with the values (2D for a DataFrame, one row per series).
+            If there is more than one date in a year, the value of the last date is used.
+        """
+        dates = data.columns if isinstance(data,pd.DataFrame) else data.index
+        return lastValuesOfYears(dates, data.values)
+
+
+    def addPlot(self,plotnumber,data,legendPos='upper left',xlabel='Date',ylabel='value',title='',line=True, label=None):
+        # plot of a Series with dates ('%Y-%m-%d') as index over the years
+        years, values = self.toYearArrays(data)
+        self.addArrays(plotnumber, years, values, legendPos=legendPos, xlabel=xlabel, ylabel=ylabel, title=title, line=line, label=label)
+
+
+    def addArrays(self,plotnumber,x,y,legendPos='upper left',xlabel='Date',ylabel='value',title='',line=True, label=None):
+        # plot of aligned arrays (e.g. the years as labels and the values)
+        ax = self.__getAxes(plotnumber)
+
+        if not line:
+            if label is None:
+                ax.plot(x, y, marker='.', linestyle="None", markersize=10)
+            else: 
+                ax.plot(x, y, marker='.', linestyle="None", markersize=10, label=label)
+        else:
+            if label is None:
+                ax.plot(x, y)
+            else:
+                ax.plot(x, y, label=label)
+
+        if label is not None:
+            ax.legend(loc='best', prop={'size': int(self.FONTSIZE*self.__FONTSIZE_FACTOR_LEGEND)})
+
+        ax.grid(True)
+
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+
+
+    def addHeatmap(self,plotnumber,data,xlabel='',ylabel='',title='',valueFormat='{v:.1f}'):
+        # heatmap of a DataFrame with the values written into the cells
+        ax = self.__getAxes(plotnumber)
+
+        values = np.asarray(data.values, dtype='float64')
+        image = ax.imshow(values, cmap='RdYlGn', aspect='auto')
+        # the colorbar is placed next to the axes, so the layout of the page is not changed
+        self._fig.colorbar(image, cax=ax.inset_axes([1.02, 0, 0.03, 1]))
+
+        ax.set_xticks(np.arange(values.shape[1]))
+        ax.set_yticks(np.arange(values.shape[0]))
+        ax.set_xticklabels(['{v:g}'.format(v=v) for v in data.columns])
+        ax.set_yticklabels([str(v) for v in data.index])
+
+        for (row, column), value in np.ndenumerate(values):
+            # cells without a value (NaN) are left empty and are not part of the colour scale
+            if not np.isfinite(value):
+                continue
+            ax.text(column, row, valueFormat.format(v=value), ha='center', va='center', fontsize=int(self.FONTSIZE*self.__FONTSIZE_FACTOR_LEGEND))
+
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+
+
+    def __closeFigure(self):
+        self._pdf.savefig(self._fig)
+        self._fig = None
+
+
+    def closePDF(self):
+
+        if self._fig is not None:
+            self.__closeFigure()
+
+        if self._template is not None:
+            _releaseTemplate(self._template)
+            self._template = None
+
+        try:
+            self._pdf.close()
+            print(self.filename + ' wurde erstellt!')
+        except:
+            print(self.filename + ' konnte nicht erstellt werden')
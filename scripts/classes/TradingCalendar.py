@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+
+class TradingCalendar():
+    """
+        Sorted index of the trading days of a price history.
+        It answers nearest, previous and next trading day queries by binary search.
+        All queries accept a single date or many dates at once (str, datetime, numpy.datetime64,
+        pandas.Timestamp, list, array or DatetimeIndex).
+    """
+
+    def __init__(self,dates):
+        self._dates = np.unique(self._toDays(dates))
+
+    @classmethod
+    def fromPrices(cls,prices):
+        # calendar of the index of a DataFrame or Series with prices
+        return cls(prices.index)
+
+    @property
+    def dates(self):
+        return self._dates
+
+    def __len__(self):
+        return len(self._dates)
+
+    @staticmethod
+    def _toDays(dates):
+        # dates as datetime64[D]; time zone aware dates keep their local date
+        dates = pd.to_datetime(np.atleast_1d(dates) if not isinstance(dates,pd.DatetimeIndex) else dates)
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        return dates.values.astype('datetime64[D]')
+
+    @staticmethod
+    def _isScalar(dates):
+        return np.ndim(dates) == 0 and not isinstance(dates,pd.DatetimeIndex)
+
+
+    def _result(self,positions,dates):
+        # trading days for the positions; NaT for positions outside of the calendar
+        valid = (positions >= 0) & (positions < len(self._dates))
+        result = np.full(len(positions), np.datetime64('NaT'), dtype='datetime64[D]')
+        result[valid] = self._dates[positions[valid]]
+        if self._isScalar(dates):
+            return result[0]
+        return result
+
+
+    def previousPosition(self,dates):
+        # position of the last trading day on or before the date (-1, if there is none)
+        positions = np.searchsorted(self._dates, self._toDays(dates), side='right') - 1
+        return positions[0] if self._isScalar(dates) else positions
+
+    def nextPosition(self,dates):
+        # position of the first trading day on or after the date (len(calendar), if there is none)
+        positions = np.searchsorted(self._dates, self._toDays(dates), side='left')
+        return positions[0] if self._isScalar(dates) else positions
+
+    def nearestPosition(self,dates):
+        # position of the trading day with the smallest distance to the date
+        # if two trading days have the same distance, the later one is used
+        if len(self._dates) == 0:
+            raise ValueError('The trading calendar is empty.')
+
+        days = self._toDays(dates)
+        nextPos = np.searchsorted(self._dates, days, side='left')
+        previousPos = nextPos - 1
+
+        hasNext = nextPos < len(self._dates)
+        hasPrevious = previousPos >= 0
+        distanceNext = self._dates[np.minimum(nextPos,len(self._dates)-1)] - days
+        distancePrevious = days - self._dates[np.maximum(previousPos,0)]
+
+        useNext = hasNext & (~hasPrevious | (distanceNext <= distancePrevious))
+        positions = np.where(useNext, nextPos, previousPos)
+        return positions[0] if self._isScalar(dates) else positions
+
+
+    def previous(self,dates):
+        return self._result(np.atleast_1d(self.previousPosition(dates)),dates)
+
+    def next(self,dates):
+        return self._result(np.atleast_1d(self.nextPosition(dates)),dates)
+
+    def nearest(self,dates):
+        return self._result(np.atleast_1d(self.nearestPosition(dates)),dates)
+
+    def contains(self,dates):
+        days = self._toDays(dates)
+        if len(self._dates) == 0:
+            result = np.zeros(len(days), dtype=bool)
+        else:
+            positions = np.minimum(np.searchsorted(self._dates, days), len(self._dates)-1)
+            result = self._dates[positions] == days
+        return result[0] if self._isScalar(dates) else result
+
+
+    def __str__(self):
+        if len(self._dates) == 0:
+            return '<TradingCalendar (empty)>'
+        return '<TradingCalendar ' + str(self._dates[0]) + ' - ' + str(self._dates[-1]) + ' (' + str(len(self._dates)) + ' days)>'
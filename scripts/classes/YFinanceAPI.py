@@ -1,8 +1,6 @@
 
 from pandas import DataFrame
 
-import yfinance as yf
-
 from utils.yfinance_extension import loadExtraIncomeStatementData, load_CashFlow
 from utils.generic import mergeDataFrame
 
@@ -25,6 +23,8 @@ class YFinanceClient():
         if self._ticker is not None:
             return self._ticker
         elif self.symbol is not None:
+            # yfinance is imported, when it is needed for the first time
+            import yfinance as yf
             self._ticker = yf.Ticker(self.symbol)
             return self._ticker
         else:
@@ -32,6 +32,7 @@ class YFinanceClient():
 
     @Ticker.setter
     def Ticker(self,ticker):
+        import yfinance as yf
         if not isinstance(ticker,yf.Ticker):
             raise TypeError('The ticker "' + str(ticker) + '" is no instance of yfinance.Ticker')
         else:
@@ -0,0 +1,115 @@
+# Free cash flow of the financial reports of Finnhub and its effect on the DCF method
+#
+# Finnhub supplies the free cash flow (cash from operating activities - capital expenditure -
+# payments for intangible assets). Yahoo finance overrides it in the merged statements, so the
+# Finnhub values only fill the years, which yahoo finance does not have. Before, these years had
+# no free cash flow and the DCF method replaced them by the mean of the yahoo values.
+#
+# usage: python -m pytest tests
+
+import sys, os
+import types
+import unittest
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.FinnhubAPI import FinnhubClient
+from classes.StockAnalyzer import StockAnalyzer
+from classes.GlobalVariables import *
+from classes import DCF
+from utils.generic import mergeDataFrame
+
+
+YEARS = list(range(2014,2020))
+CASH_FROM_OPERATIONS = {year: 100.0e6 + 10.0e6*i for i, year in enumerate(YEARS)}
+CAPITAL_EXPENDITURE = 30.0e6
+PAYMENTS_FOR_INTANGIBLE_ASSETS = 5.0e6
+
+# yahoo finance has the last four years only
+YAHOO_FREE_CASH_FLOW = {'2019-06-30': 150.0e6, '2018-06-30': 120.0e6, '2017-06-30': 110.0e6, '2016-06-30': 80.0e6}
+
+
+def createPayload():
+    data = []
+    for year in reversed(YEARS):
+        report = {
+            'bs': [{'concept': 'Assets', 'value': 1.0e9}],
+            'ic': [{'concept': 'NetIncomeLoss', 'value': 50.0e6}],
+            'cf': [
+                {'concept': 'NetCashProvidedByUsedInOperatingActivities', 'value': CASH_FROM_OPERATIONS[year]},
+                {'concept': 'PaymentsToAcquirePropertyPlantAndEquipment', 'value': CAPITAL_EXPENDITURE},
+                {'concept': 'PaymentsToAcquireIntangibleAssets', 'value': PAYMENTS_FOR_INTANGIBLE_ASSETS},
+            ],
+        }
+        data.append({'endDate': '%d-06-30 00:00:00' % year, 'report': report})
+    return data
+
+
+def finnhubMainData():
+    client = FinnhubClient('TEST')
+    client.getFinancialsAsReported = lambda quarterly=False: createPayload()
+    return client.getFinancialsAsReportedDataFrame()[1]
+
+
+def yahooStatements():
+    return pd.DataFrame([YAHOO_FREE_CASH_FLOW], index=[FREE_CASH_FLOW])
+
+
+def dcfStartValue(financialStatements):
+    analyzer = object.__new__(StockAnalyzer)
+    analyzer.stock = types.SimpleNamespace(financialStatements=financialStatements)
+    return analyzer.calcDCFStartValue()
+
+
+class FinnhubFreeCashFlowTest(unittest.TestCase):
+
+    def test_free_cash_flow_of_the_reports(self):
+        freeCashFlow = finnhubMainData().loc[FREE_CASH_FLOW]
+        for year in YEARS:
+            self.assertEqual(freeCashFlow['%d-06-30' % year], CASH_FROM_OPERATIONS[year] - CAPITAL_EXPENDITURE - PAYMENTS_FOR_INTANGIBLE_ASSETS)
+
+    def test_yahoo_overrides_finnhub(self):
+        merged = mergeDataFrame(finnhubMainData(), yahooStatements())
+        freeCashFlow = merged.loc[FREE_CASH_FLOW]
+        for date, value in YAHOO_FREE_CASH_FLOW.items():
+            self.assertEqual(freeCashFlow[date], value)
+        # the years without yahoo data are filled by finnhub
+        self.assertEqual(freeCashFlow['2014-06-30'], 65.0e6)
+        self.assertEqual(freeCashFlow['2015-06-30'], 75.0e6)
+
+    def test_impact_on_the_dcf_start_value(self):
+        # before: only the free cash flows of yahoo finance, 2014 and 2015 are the mean of the yahoo values
+        yahooOnly = mergeDataFrame(finnhubMainData().drop(FREE_CASH_FLOW), yahooStatements())
+        startValueBefore, yearsBefore, cashFlowsBefore = dcfStartValue(yahooOnly)
+
+        # now: the free cash flows of finnhub fill the years 2014 and 2015
+        merged = mergeDataFrame(finnhubMainData(), yahooStatements())
+        startValue, years, cashFlows = dcfStartValue(merged)
+
+        self.assertEqual(yearsBefore, YEARS)
+        self.assertEqual(years, YEARS)
+        self.assertEqual(cashFlowsBefore, [115.0e6, 115.0e6, 80.0e6, 110.0e6, 120.0e6, 150.0e6])
+        self.assertEqual(cashFlows, [65.0e6, 75.0e6, 80.0e6, 110.0e6, 120.0e6, 150.0e6])
+
+        # start value: mean of the last free cash flow and the value of the linear trend in the last year
+        def expectedStartValue(values):
+            slope, intercept = np.polyfit(np.arange(len(values)), values, 1)
+            return (slope*(len(values)-1) + intercept + values[-1])/2
+
+        self.assertAlmostEqual(startValueBefore, expectedStartValue(cashFlowsBefore), places=2)
+        self.assertAlmostEqual(startValue, expectedStartValue(cashFlows), places=2)
+        self.assertAlmostEqual(startValueBefore/1e6, 140.357142857, places=6)
+        self.assertAlmostEqual(startValue/1e6, 146.071428571, places=6)
+
+        # the steeper trend of the reported free cash flows raises the value per share by about 4%
+        assumptions = (0.09, 0.05, 0.04, 0.02, 0.0)
+        valueBefore = DCF.perShareValue(startValueBefore, 1.0e6, *assumptions)
+        value = DCF.perShareValue(startValue, 1.0e6, *assumptions)
+        self.assertGreater(value, valueBefore)
+        self.assertAlmostEqual(value/valueBefore, startValue/startValueBefore)
+        self.assertAlmostEqual(value/valueBefore, 1.0407, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,38 +1,124 @@
 
+import os
 import numpy as np
-from datetime import datetime
+import pandas as pd
+
+
+# root folder for all data, which is stored locally (e.g. cached responses)
+# it can be changed by the environment variable STOCKANALYZER_CACHE
+CACHE_FOLDER = os.environ.get('STOCKANALYZER_CACHE', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache'))
+
+
+def setPandasDisplayOptions():
+    # Einstellungen, damit Pandas DataFrames immer vollstaendig geplotted werden
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.width', None)
+    pd.set_option('display.max_colwidth', None)
+
+
+def getCacheFolder(subfolder=''):
+    folder = os.path.join(CACHE_FOLDER, subfolder)
+    if not os.path.isdir(folder):
+        os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _toDateTime64Array(values):
+    # datetime64 values in nanoseconds; for time zone aware dates the values are in UTC
+    if isinstance(values,pd.DatetimeIndex):
+        values = values.values
+    return np.asarray(values).astype('datetime64[ns]')
+
+
+def npDateTime64_2_DatetimeIndex(npDatetime64):
+    # converts an array (or list) of datetime64 values to a pandas.DatetimeIndex in one call
+    return pd.DatetimeIndex(_toDateTime64Array(npDatetime64))
+
+
+def npDateTime64_2_strArray(npDatetime64,format='%Y-%m-%d'):
+    # converts an array (or list) of datetime64 values to an array of strings in one call
+    values = _toDateTime64Array(npDatetime64)
+    if format == '%Y-%m-%d':
+        return np.datetime_as_string(values.astype('datetime64[D]'), unit='D')
+    elif format == '%Y':
+        return np.datetime_as_string(values.astype('datetime64[Y]'), unit='Y')
+    else:
+        return np.asarray(pd.DatetimeIndex(values).strftime(format))
 
 
 def npDateTime64_2_datetime(npDatetime64):
     if isinstance(npDatetime64,list) or isinstance(npDatetime64,np.ndarray):
-        return [npDateTime64_2_datetime(dt) for dt in npDatetime64]
+        return list(npDateTime64_2_DatetimeIndex(npDatetime64).to_pydatetime())
     elif isinstance(npDatetime64,np.datetime64):
-        ts = (npDatetime64 - np.datetime64('1970-01-01T00:00:00Z')) / np.timedelta64(1, 's')
-        return datetime.utcfromtimestamp(ts)
+        return pd.Timestamp(npDatetime64).to_pydatetime()
 
 
 def npDateTime64_2_str(npDatetime64,format='%Y-%m-%d'):
     if isinstance(npDatetime64,list) or isinstance(npDatetime64,np.ndarray):
-        return [npDateTime64_2_datetime(dt).strftime(format) for dt in npDatetime64]
+        return npDateTime64_2_strArray(npDatetime64,format).tolist()
     else:
-        return npDateTime64_2_datetime(npDatetime64).strftime(format)
+        return str(npDateTime64_2_strArray([npDatetime64],format)[0])
+
+
+def lastValuesOfYears(dates,values):
+    """
+        Years (as labels, e.g. '2020') and the values of the last date of every year, in ascending order
+        - dates: dates as strings ('%Y-%m-%d'), datetime64 or DatetimeIndex (in any order)
+        - values: array with one value per date in the last axis (e.g. shape (rows, dates))
+        Returns the array of the years and the values with the years in the last axis.
+    """
+    dates = pd.to_datetime(pd.Index(dates).astype(str), format='%Y-%m-%d').values
+    order = np.argsort(dates, kind='stable')
+    years = npDateTime64_2_strArray(dates[order], '%Y')
+
+    isLast = np.ones(len(years), dtype=bool)
+    isLast[:-1] = years[1:] != years[:-1]
+    values = np.asarray(values, dtype='float64')[...,order]
+    return years[isLast], values[...,isLast]
+
+
+def normalizeColumnLabels(columns):
+    # dates in the column labels are converted to strings (e.g. '2020-06-30')
+    if isinstance(columns,pd.DatetimeIndex):
+        return pd.Index(np.datetime_as_string(columns.values, unit='D'))
+    elif columns.dtype == object:
+        isDate = np.array([isinstance(c,np.datetime64) for c in columns], dtype=bool)
+        if not np.any(isDate):
+            return columns
+        labels = np.array(columns, dtype=object)
+        labels[isDate] = npDateTime64_2_strArray(list(labels[isDate]))
+        return pd.Index(labels)
+    else:
+        return columns
 
 
 def mergeDataFrame(dataFrame1,dataFrame2):
+    """
+        Merges dataFrame2 into dataFrame1. All values of dataFrame2, which are not None or NaN,
+        override the values of dataFrame1. Rows and columns, which are not in dataFrame1, are appended.
+        The merged DataFrame is returned, dataFrame1 is not changed.
+    """
+    # dates in the column labels of both DataFrames (e.g. DatetimeIndex of yfinance) are compared as strings
+    merged = dataFrame1.copy()
+    merged.columns = normalizeColumnLabels(merged.columns)
+
+    df = dataFrame2.copy(deep=False)
+    df.columns = normalizeColumnLabels(df.columns)
+
+    # if a label exists more than once, the last one wins
+    df = df.loc[~df.index.duplicated(keep='last'), ~df.columns.duplicated(keep='last')]
+
+    # rows and columns without any value are not merged
+    notNull = df.notna()
+    df = df.loc[notNull.any(axis=1), notNull.any(axis=0)]
+    if df.size == 0:
+        return merged
+
+    # align both DataFrames on all rows and columns
+    rows = merged.index.append(df.index.difference(merged.index, sort=False))
+    columns = merged.columns.append(df.columns.difference(merged.columns, sort=False))
+    merged = merged.reindex(index=rows, columns=columns)
+    df = df.reindex(index=rows, columns=columns)
 
-    # loop over all rows and columns
-    for row in dataFrame2.index.values:
-        for column in dataFrame2.columns.values:
-
-            # try to covert the column name to a string, if it is a date
-            if isinstance(column,np.datetime64):
-                columnName = npDateTime64_2_str(column)
-            else:
-                columnName = column
-            
-            if (not dataFrame2.loc[row,column] is None) and (not np.isnan(dataFrame2.loc[row,column])):
-                dataFrame1.loc[row,columnName] = dataFrame2.loc[row,column]
-            #else:
-                #print('Do not merge ' + row + ' at ' + columnName + ' because of NAN')
-
-    return dataFrame1
\ No newline at end of file
+    return merged.mask(df.notna(), df).infer_objects()
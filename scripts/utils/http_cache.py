@@ -0,0 +1,204 @@
+# persistent on-disk cache for http responses
+#
+# The responses are stored compressed in the cache folder. The name of each file is the
+# hash of the request (url and parameters without the API token), so the same request
+# always ends up in the same file. Each endpoint has its own time to live, because
+# annual statements change only a few times a year, but a quote changes every minute.
+# If the cache grows larger than the allowed size, the least recently used files are removed.
+
+import os
+import time
+import zlib
+import hashlib
+import threading
+
+from utils.generic import getCacheFolder
+from utils.http_session import getTransport
+
+
+# time to live of the cached responses in seconds
+MINUTE = 60
+HOUR = 60*MINUTE
+DAY = 24*HOUR
+
+DEFAULT_TTL = DAY
+
+ENDPOINT_TTL = {
+    # yahoo finance pages
+    'financials': 7*DAY,
+    'cash-flow': 7*DAY,
+    'key-statistics': DAY,
+    # finnhub api
+    'quote': MINUTE,
+    'stock/dividend': DAY,
+    'stock/peers': 7*DAY,
+    'stock/metric': DAY,
+    'stock/recommendation': DAY,
+    'stock/eps-estimate': DAY,
+    'stock/financials-reported': 7*DAY,
+    'stock/profile2': 30*DAY,
+}
+
+# maximum size of the cache folder in bytes
+MAX_CACHE_SIZE = 500*1024**2
+
+# parameters, which are not part of the cache key
+IGNORED_PARAMETERS = ['token']
+
+
+class ResponseCache():
+
+    FILE_EXTENSION = '.z'
+    COMPRESSION_LEVEL = 6
+
+    def __init__(self,folder,maxSize=MAX_CACHE_SIZE):
+        self.folder = folder
+        self.maxSize = maxSize
+
+        self._lock = threading.Lock()
+        self._size = None
+
+    @staticmethod
+    def makeKey(url,params=None):
+        key = url
+        if params is not None:
+            key += '?' + '&'.join([str(k) + '=' + str(v) for k,v in sorted(params.items()) if k not in IGNORED_PARAMETERS])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+    def _path(self,key):
+        return os.path.join(self.folder, key + self.FILE_EXTENSION)
+
+
+    def get(self,key,ttl=DEFAULT_TTL):
+        path = self._path(key)
+        try:
+            modified = os.path.getmtime(path)
+            if (time.time() - modified) > ttl:
+                return None
+
+            with open(path,'rb') as f:
+                content = zlib.decompress(f.read())
+
+            # the access time is used for the LRU eviction
+            os.utime(path, (time.time(), modified))
+            return content
+        except (OSError, zlib.error):
+            return None
+
+
+    def set(self,key,content):
+        path = self._path(key)
+        data = zlib.compress(content, self.COMPRESSION_LEVEL)
+
+        # the cache is only a cache, so a response, which can not be stored (e.g. full disk), is still returned
+        try:
+            try:
+                oldSize = os.path.getsize(path)
+            except OSError:
+                oldSize = 0
+
+            # write to a temporary file first, so that other processes never read a half written file
+            tmpPath = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+            try:
+                with open(tmpPath,'wb') as f:
+                    f.write(data)
+                os.replace(tmpPath, path)
+            except OSError:
+                if os.path.exists(tmpPath):
+                    os.remove(tmpPath)
+                raise
+
+            with self._lock:
+                if self._size is None:
+                    self._size = self._scanSize()
+                else:
+                    # an overwritten file is only counted once
+                    self._size += len(data) - oldSize
+
+                if self._size > self.maxSize:
+                    self._evict()
+        except OSError:
+            pass
+
+
+    def _listFiles(self):
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(self.FILE_EXTENSION):
+                stat = entry.stat()
+                files.append((stat.st_atime, stat.st_size, entry.path))
+        return files
+
+
+    def _scanSize(self):
+        return sum([size for atime, size, path in self._listFiles()])
+
+
+    def _evict(self):
+        # remove the least recently used files, until the cache uses 90% of the allowed size
+        files = sorted(self._listFiles())
+        size = sum([size for atime, size, path in files])
+        for atime, fileSize, path in files:
+            if size <= 0.9*self.maxSize:
+                break
+            try:
+                os.remove(path)
+                size -= fileSize
+            except OSError:
+                pass
+        self._size = size
+
+
+    def clear(self):
+        with self._lock:
+            for atime, size, path in self._listFiles():
+                os.remove(path)
+            self._size = 0
+
+
+
+_responseCache = None
+
+def getResponseCache():
+    global _responseCache
+    if _responseCache is None:
+        _responseCache = ResponseCache(getCacheFolder('http'))
+    return _responseCache
+
+
+def cachedFetch(url,endpoint,fetch,params=None,ttl=None):
+    """
+        Returns the cached content for the request. If it is not in the cache or if it is older
+        than the time to live of the endpoint, the function "fetch" is called to load the content
+        as bytes. If "fetch" returns None, nothing is cached and None is returned.
+    """
+    if ttl is None:
+        ttl = ENDPOINT_TTL.get(endpoint,DEFAULT_TTL)
+
+    cache = getResponseCache()
+    key = cache.makeKey(url,params)
+
+    content = cache.get(key,ttl)
+    if content is not None:
+        return content
+
+    content = fetch()
+    if content is not None:
+        cache.set(key,content)
+    return content
+
+
+def cachedGet(url,endpoint,params=None,ttl=None):
+    """
+        Returns the body of the response as bytes. The response is only loaded from the
+        network, if it is not in the cache or if it is older than the time to live of the endpoint.
+        If the request fails, None is returned.
+    """
+    def fetch():
+        r = getTransport().get(url, params=params)
+        if not r.ok:
+            return None
+        return r.content
+
+    return cachedFetch(url,endpoint,fetch,params=params,ttl=ttl)
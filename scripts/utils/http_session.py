@@ -0,0 +1,128 @@
+# shared http transport for all requests to finnhub and yahoo finance
+#
+# All requests use one requests.Session, so the connections are kept alive and reused
+# instead of doing a new TCP and TLS handshake for every request. The responses are
+# transferred compressed, every request has a timeout and the number of concurrent
+# requests to one host is limited.
+
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests as _requests
+from requests.adapters import HTTPAdapter
+
+
+# timeouts in seconds
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+# number of hosts, for which a connection pool is kept
+POOL_CONNECTIONS = 16
+# number of connections, which are kept alive per host
+POOL_MAXSIZE = 8
+
+# maximum number of concurrent requests per host
+MAX_CONCURRENT_REQUESTS = 8
+HOST_CONCURRENCY = {
+    'finnhub.io': 4,
+}
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'User-Agent': 'Mozilla/5.0 (compatible; StockAnalyzer)',
+}
+
+
+class HttpTransport():
+
+    def __init__(self,connectTimeout=CONNECT_TIMEOUT,readTimeout=READ_TIMEOUT,maxConcurrentRequests=MAX_CONCURRENT_REQUESTS,hostConcurrency=None):
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.maxConcurrentRequests = maxConcurrentRequests
+        self.hostConcurrency = dict(HOST_CONCURRENCY)
+        if hostConcurrency is not None:
+            self.hostConcurrency.update(hostConcurrency)
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._semaphores = {}
+
+    @property
+    def timeout(self):
+        return (self.connectTimeout, self.readTimeout)
+
+    @property
+    def session(self):
+        # a session must not be shared with forked worker processes
+        with self._lock:
+            if (self._session is None) or (self._pid != os.getpid()):
+                self._session = self._createSession()
+                self._pid = os.getpid()
+                self._semaphores = {}
+            return self._session
+
+
+    def _createSession(self):
+        session = _requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+
+    def _hostSemaphore(self,url):
+        host = urlparse(url).hostname
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.hostConcurrency.get(host,self.maxConcurrentRequests))
+            return self._semaphores[host]
+
+
+    def request(self,method,url,**kwargs):
+        kwargs.setdefault('timeout',self.timeout)
+        session = self.session
+        with self._hostSemaphore(url):
+            return session.request(method, url, **kwargs)
+
+
+    def get(self,url,**kwargs):
+        return self.request('GET',url,**kwargs)
+
+
+    @contextmanager
+    def stream(self,url,**kwargs):
+        # the slot of the host is kept, until the response is closed
+        kwargs.setdefault('timeout',self.timeout)
+        session = self.session
+        with self._hostSemaphore(url):
+            r = session.get(url, stream=True, **kwargs)
+            try:
+                yield r
+            finally:
+                r.close()
+
+
+
+_transport = None
+
+def getTransport():
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport()
+    return _transport
+
+
+def configureTransport(**kwargs):
+    """
+        Replaces the shared transport by a new one with the given settings
+        (connectTimeout, readTimeout, maxConcurrentRequests, hostConcurrency)
+    """
+    global _transport
+    _transport = HttpTransport(**kwargs)
+    return _transport
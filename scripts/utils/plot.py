@@ -1,12 +1,9 @@
 
 
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib as mpl
-
-
 
 def createPlot(x_data_list,y_data_list,legend_list=None):
+    # pyplot is only imported, when a plot is created
+    import matplotlib.pyplot as plt
 
     # add a plot
     fig, ax = plt.subplots()
@@ -0,0 +1,205 @@
+# local columnar store for daily prices
+#
+# Each symbol has its own folder with one raw binary file per column (dates as datetime64[D],
+# prices and volume as float64) and a small JSON file with the number of rows and the range of
+# dates, which was already requested from yahoo finance. The column files are read as
+# memory-mapped arrays, so a range of dates is a slice of the files without copying them.
+# New prices are appended to the end of the files, so a refresh only writes the new days.
+# The number of rows in the JSON file is written last, so bytes of an interrupted append are ignored.
+
+import os
+import json
+import time
+import threading
+import numpy as np
+from urllib.parse import quote
+
+from utils.generic import getCacheFolder
+
+
+DATE_COLUMN = 'Date'
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+DATE_DTYPE = np.dtype('datetime64[D]')
+VALUE_DTYPE = np.dtype('float64')
+
+META_FILE = 'meta.json'
+LOCK_FILE = 'lock'
+FILE_EXTENSION = '.bin'
+
+# seconds after which the lock of another process is regarded as stale
+LOCK_TIMEOUT = 60
+
+
+class _FolderLock():
+    # lock for the folder of a symbol, which works across processes (e.g. in batch mode)
+
+    def __init__(self,folder):
+        self.path = os.path.join(folder, LOCK_FILE)
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if (time.time() - os.path.getmtime(self.path)) > LOCK_TIMEOUT:
+                        os.remove(self.path)
+                except OSError:
+                    pass
+                time.sleep(0.01)
+
+    def __exit__(self,*args):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class PriceStore():
+    """
+        Columnar store of the daily prices of many symbols.
+        - columns: names of the value columns (all stored as float64)
+    """
+
+    def __init__(self,folder,columns=PRICE_COLUMNS):
+        self.folder = folder
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+
+
+    def _symbolFolder(self,symbol):
+        # symbols like "^GDAXI" are escaped, so they can be used as folder name
+        return os.path.join(self.folder, quote(symbol, safe=''))
+
+
+    def _columnPath(self,symbol,column):
+        return os.path.join(self._symbolFolder(symbol), quote(column, safe='') + FILE_EXTENSION)
+
+
+    def readMeta(self,symbol):
+        # dict with the number of rows and the range of requested dates; None, if the symbol is not stored
+        try:
+            with open(os.path.join(self._symbolFolder(symbol), META_FILE),'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def _writeMeta(self,symbol,meta):
+        path = os.path.join(self._symbolFolder(symbol), META_FILE)
+        tmpPath = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        with open(tmpPath,'w') as f:
+            json.dump(meta,f)
+        os.replace(tmpPath, path)
+
+
+    def _map(self,symbol,column,dtype,rows):
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._columnPath(symbol,column), dtype=dtype, mode='r', shape=(rows,))
+
+
+    def read(self,symbol,start=None,end=None):
+        """
+            Prices of the symbol from start to end (both included, datetime64[D] or None for no limit)
+            as dict column -> array. The arrays are read-only slices of the memory-mapped files; they must
+            be copied or dropped, before the prices of the symbol are written (mapped files can not be
+            replaced or truncated on Windows). Returns None, if the symbol is not stored.
+        """
+        meta = self.readMeta(symbol)
+        if meta is None:
+            return None
+
+        rows = meta['rows']
+        try:
+            dates = self._map(symbol,DATE_COLUMN,DATE_DTYPE,rows)
+            first = 0 if start is None else np.searchsorted(dates, np.datetime64(start,'D'), side='left')
+            last = rows if end is None else np.searchsorted(dates, np.datetime64(end,'D'), side='right')
+
+            data = {DATE_COLUMN: dates[first:last]}
+            for column in self.columns:
+                data[column] = self._map(symbol,column,VALUE_DTYPE,rows)[first:last]
+            return data
+        except (OSError, ValueError):
+            # missing or shorter files (e.g. replaced by another process in the meantime)
+            return None
+
+
+    def write(self,symbol,dates,values,requestedStart,requestedEnd):
+        """
+            Replaces the stored prices of the symbol
+            - dates: sorted array of datetime64[D]
+            - values: dict column -> array with the same length as dates
+            - requestedStart, requestedEnd: range of dates, which is covered by the prices
+        """
+        folder = self._symbolFolder(symbol)
+        os.makedirs(folder, exist_ok=True)
+
+        with self._lock, _FolderLock(folder):
+            # files of other processes, which are still mapped, must not be overwritten in place
+            for column, array, dtype in self._columnArrays(dates,values):
+                path = self._columnPath(symbol,column)
+                tmpPath = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+                array.astype(dtype).tofile(tmpPath)
+                os.replace(tmpPath, path)
+
+            self._writeMeta(symbol, self._meta(len(dates),requestedStart,requestedEnd))
+
+
+    def append(self,symbol,dates,values,requestedEnd):
+        """
+            Appends the prices after the last stored date and extends the requested range to requestedEnd.
+            Prices of dates, which are already stored, are ignored.
+        """
+        folder = self._symbolFolder(symbol)
+
+        with self._lock, _FolderLock(folder):
+            meta = self.readMeta(symbol)
+            if meta is None:
+                raise ValueError('The prices of "' + symbol + '" are not stored. Use write() first.')
+
+            rows = meta['rows']
+            dates = np.asarray(dates, dtype=DATE_DTYPE)
+            if rows > 0:
+                # the last date is read without mapping the file, because a mapped file can not be truncated (e.g. on Windows)
+                lastDate = np.fromfile(self._columnPath(symbol,DATE_COLUMN), dtype=DATE_DTYPE, count=1, offset=(rows-1)*DATE_DTYPE.itemsize)[0]
+                isNew = dates > lastDate
+                dates = dates[isNew]
+                values = {column: np.asarray(values[column])[isNew] for column in self.columns}
+
+            for column, array, dtype in self._columnArrays(dates,values):
+                path = self._columnPath(symbol,column)
+                if (len(array) == 0) and (rows > 0) and (os.path.getsize(path) == rows*dtype.itemsize):
+                    # nothing to append (the files are not touched)
+                    continue
+                with open(path,'r+b' if rows > 0 else 'wb') as f:
+                    # bytes of an interrupted append are overwritten
+                    f.seek(rows*dtype.itemsize)
+                    f.truncate()
+                    f.write(array.astype(dtype).tobytes())
+
+            meta = self._meta(rows+len(dates), meta['start'], max(np.datetime64(meta['end'],'D'),np.datetime64(requestedEnd,'D')))
+            self._writeMeta(symbol,meta)
+            return len(dates)
+
+
+    def _columnArrays(self,dates,values):
+        yield DATE_COLUMN, np.asarray(dates), DATE_DTYPE
+        for column in self.columns:
+            yield column, np.asarray(values[column]), VALUE_DTYPE
+
+
+    @staticmethod
+    def _meta(rows,requestedStart,requestedEnd):
+        return {'rows': int(rows), 'start': str(np.datetime64(requestedStart,'D')), 'end': str(np.datetime64(requestedEnd,'D'))}
+
+
+
+_priceStore = None
+
+def getPriceStore():
+    global _priceStore
+    if _priceStore is None:
+        _priceStore = PriceStore(getCacheFolder('prices'))
+    return _priceStore
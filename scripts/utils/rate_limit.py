@@ -0,0 +1,157 @@
+# process-wide rate limiting for http requests
+#
+# Every API key gets one token bucket. Each request takes a token; if the bucket is
+# empty, the caller waits until the bucket is refilled instead of failing. If the server
+# answers with HTTP 429 (too many requests), the whole bucket is paused for the time
+# given in the header "Retry-After" and the request is repeated. If the request is still
+# throttled after MAX_ATTEMPTS, RateLimitExceeded is raised.
+#
+# The buckets only exist in one process. If several processes use the same API key (e.g. the
+# worker processes of the batch mode), setSharingProcesses() gives each process its share of
+# the rate, so all processes together keep the limit.
+
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from utils.http_session import getTransport
+
+
+HTTP_TOO_MANY_REQUESTS = 429
+
+# maximum number of attempts for one request, if the server answers with HTTP 429
+MAX_ATTEMPTS = 8
+# upper limit in seconds for the exponential backoff, if there is no "Retry-After" header
+MAX_BACKOFF = 60
+
+
+class RateLimitExceeded(Exception):
+    # the server still answered with HTTP 429 after all attempts
+    pass
+
+
+class TokenBucket():
+
+    def __init__(self,rate,capacity):
+        # rate: number of tokens, which are added per second
+        # capacity: maximum number of tokens (burst)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+        self._tokens = float(capacity)
+        self._lastRefill = time.monotonic()
+        self._pausedUntil = 0.0
+        self._lock = threading.Lock()
+
+        # counters
+        self.requests = 0
+        self.waits = 0
+        self.waitTime = 0.0
+        self.throttled = 0
+
+
+    def _refill(self,now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._lastRefill)*self.rate)
+        self._lastRefill = now
+
+
+    def acquire(self,tokens=1):
+        # blocks until the tokens are available and returns the time spent waiting in seconds
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._pausedUntil:
+                    self._refill(now)
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        self.requests += 1
+                        waitTime = now - start
+                        if waited:
+                            self.waits += 1
+                            self.waitTime += waitTime
+                        return waitTime
+                    delay = (tokens - self._tokens)/self.rate
+                else:
+                    delay = self._pausedUntil - now
+            waited = True
+            time.sleep(delay)
+
+
+    def pause(self,seconds):
+        # no tokens are handed out for the given time
+        with self._lock:
+            now = time.monotonic()
+            self._pausedUntil = max(self._pausedUntil, now + seconds)
+            self._tokens = 0.0
+            self._lastRefill = self._pausedUntil
+            self.throttled += 1
+
+
+    def statistics(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'waits': self.waits,
+                'waitTime': self.waitTime,
+                'throttled': self.throttled
+            }
+
+
+
+_buckets = {}
+_bucketsLock = threading.Lock()
+# number of processes, which share the rate limits
+_sharingProcesses = 1
+
+def setSharingProcesses(processes):
+    # each process gets 1/processes of the rate and the burst (buckets, which already exist, are created again)
+    global _sharingProcesses
+    with _bucketsLock:
+        _sharingProcesses = max(1,int(processes))
+        _buckets.clear()
+
+
+def getTokenBucket(key,rate,capacity):
+    # one bucket per key (e.g. API key) for the whole process
+    with _bucketsLock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(float(rate)/_sharingProcesses, max(1.0, float(capacity)/_sharingProcesses))
+        return _buckets[key]
+
+
+def getRetryAfter(response,attempt):
+    # time to wait in seconds, as given in the header "Retry-After" (seconds or http date)
+    retryAfter = response.headers.get('Retry-After')
+    if retryAfter is not None:
+        try:
+            return max(0.0, float(retryAfter))
+        except ValueError:
+            pass
+        try:
+            retryDate = parsedate_to_datetime(retryAfter)
+            return max(0.0, (retryDate - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+
+    # exponential backoff
+    return min(2**attempt, MAX_BACKOFF)
+
+
+def rateLimitedGet(bucket,url,params=None,maxAttempts=MAX_ATTEMPTS):
+    """
+        GET request, which takes a token of the bucket before each attempt.
+        If the server answers with HTTP 429, the bucket is paused and the request is repeated.
+        The response is returned. RateLimitExceeded is raised, if all attempts were throttled.
+    """
+    for attempt in range(maxAttempts):
+        bucket.acquire()
+        r = getTransport().get(url, params=params)
+        if r.status_code != HTTP_TOO_MANY_REQUESTS:
+            return r
+        bucket.pause(getRetryAfter(r,attempt))
+
+    print(' +++ Request to ' + url + ' was throttled ' + str(maxAttempts) + ' times (HTTP 429) +++ ')
+    raise RateLimitExceeded('The request to "' + url + '" was still throttled after ' + str(maxAttempts) + ' attempts.')
@@ -0,0 +1,90 @@
+# single-flight execution of identical calls
+#
+# If several threads request the same key at the same time, only the first one calls the
+# function; the others wait for its result. By default the result is dropped, as soon as the
+# call is finished, so later calls are done again (e.g. answered by the response cache).
+# With keepResults=True the results are kept in memory, until they are released with
+# forget(), forgetIf() or clear(). If a call is given a time to live (ttl in seconds), its
+# result is kept for this time only (also without keepResults).
+
+import time
+import threading
+
+
+class _Call():
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+
+    def __init__(self,keepResults=False):
+        self.keepResults = keepResults
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+        # expiry times (time.monotonic()) of the results, which were kept with a time to live
+        self._expires = {}
+
+
+    def do(self,key,function,ttl=None):
+        with self._lock:
+            if key in self._results:
+                if (key not in self._expires) or (time.monotonic() < self._expires[key]):
+                    return self._results[key]
+                del self._results[key]
+                del self._expires[key]
+
+            call = self._calls.get(key)
+            isLeader = call is None
+            if isLeader:
+                call = _Call()
+                self._calls[key] = call
+
+        # wait for the call, which is already running
+        if not isLeader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # failed requests (None) are not kept, so that they can be repeated later
+                if (self.keepResults or (ttl is not None)) and (call.error is None) and (call.result is not None):
+                    self._results[key] = call.result
+                    if ttl is not None:
+                        self._expires[key] = time.monotonic() + ttl
+                    else:
+                        self._expires.pop(key,None)
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
+
+
+    def forget(self,key):
+        with self._lock:
+            self._results.pop(key,None)
+            self._expires.pop(key,None)
+
+
+    def forgetIf(self,condition):
+        # releases all results, whose key fulfills the condition
+        with self._lock:
+            self._results = {key: result for key, result in self._results.items() if not condition(key)}
+            self._expires = {key: expires for key, expires in self._expires.items() if key in self._results}
+
+
+    def clear(self):
+        with self._lock:
+            self._results = {}
+            self._expires = {}
@@ -0,0 +1,164 @@
+# local store for the merged financial statements
+#
+# The merged statements of each symbol are stored as one .npz file with the values (float64),
+# the row and column labels and the source of every value (index of the source + 1, 0 for
+# no value), together with a small JSON file with the names of the sources and the time of the
+# download. The statements only need to be downloaded again, when a newer fiscal period could
+# have been published since the last download (see needsRefresh).
+
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from pandas import DataFrame
+
+from utils.generic import getCacheFolder, normalizeColumnLabels
+
+
+DATE_FORMAT = '%Y-%m-%d'
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# length of a fiscal year; a new annual report can not exist before the end of the next fiscal year
+FISCAL_YEAR = timedelta(days=365)
+# after the end of a fiscal year the report is expected any time, so it is looked for at most once a day
+RETRY_INTERVAL = timedelta(days=1)
+
+
+def provenance(merged,sources):
+    """
+        Source of every value of the merged DataFrame as int8 array with the shape of merged:
+        index of the source in the list "sources" + 1, or 0, if no source has a value.
+        The sources are listed in the order, in which they were merged (later sources override former ones).
+    """
+    codes = np.zeros(merged.shape, dtype=np.int8)
+    for i, source in enumerate(sources):
+        if (source is None) or (source.size == 0):
+            continue
+        df = source.copy(deep=False)
+        df.columns = normalizeColumnLabels(df.columns)
+        df = df.loc[~df.index.duplicated(keep='last'), ~df.columns.duplicated(keep='last')]
+        hasValue = df.reindex(index=merged.index, columns=merged.columns).notna().values
+        codes[hasValue] = i+1
+    return codes
+
+
+def latestPeriod(columns):
+    # latest date of the column labels (None, if there is no date)
+    dates = pd.to_datetime(pd.Index(columns).astype(str), format=DATE_FORMAT, errors='coerce')
+    dates = dates[dates.notna()]
+    if len(dates) == 0:
+        return None
+    return dates.max().to_pydatetime()
+
+
+def reportDates(dates):
+    # dates of the publication of the reports of the stock data file (dict "dates" of StockData)
+    if dates is None:
+        return []
+    reports = []
+    for key in ['quarterlyReports','annualyReports']:
+        for report in dates.get(key,[]) or []:
+            try:
+                reports.append(datetime.strptime(report['date'],DATE_FORMAT))
+            except (KeyError, TypeError, ValueError):
+                pass
+    return reports
+
+
+def needsRefresh(meta,columns,dates=None,now=None):
+    """
+        Returns True, if a newer fiscal period than the stored one could have been published since the last download:
+        - a report date of the stock data file (dates.quarterlyReports, dates.annualyReports) is between the last download and now
+        - or the fiscal year after the latest stored period is over (checked at most once per RETRY_INTERVAL)
+    """
+    if now is None:
+        now = datetime.now()
+    fetched = datetime.strptime(meta['fetched'],TIMESTAMP_FORMAT)
+
+    if any([fetched < date <= now for date in reportDates(dates)]):
+        return True
+
+    latest = latestPeriod(columns)
+    if latest is None:
+        return True
+    return (now >= latest + FISCAL_YEAR) and (now - fetched >= RETRY_INTERVAL)
+
+
+class StatementsStore():
+
+    def __init__(self,folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+
+
+    def _path(self,symbol,extension):
+        # symbols like "^GDAXI" are escaped, so they can be used as file name
+        return os.path.join(self.folder, quote(symbol, safe='') + extension)
+
+
+    def load(self,symbol):
+        """
+            Returns the stored statements as (DataFrame, provenance, meta) or None, if they are not stored.
+            - provenance: int8 array with the source of every value (see provenance())
+            - meta: dict with the names of the sources and the time of the download
+        """
+        try:
+            with open(self._path(symbol,'.json'),'r') as f:
+                meta = json.load(f)
+            with np.load(self._path(symbol,'.npz'), allow_pickle=False) as data:
+                df = DataFrame(data['values'], index=pd.Index(data['rows']), columns=pd.Index(data['columns']))
+                codes = data['provenance']
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # values of another download, if the files of another process were replaced in the meantime
+        if meta.get('shape') != list(df.shape):
+            return None
+
+        df.index = df.index.astype(object)
+        df.columns = df.columns.astype(object)
+        return df, codes, meta
+
+
+    def save(self,symbol,df,sources,names):
+        """
+            Stores the merged statements
+            - df: merged DataFrame
+            - sources: list of the DataFrames, which were merged (in the order of the merge)
+            - names: names of the sources (e.g. ['finnhub','yahoo'])
+        """
+        values = df.apply(pd.to_numeric, errors='coerce').values.astype('float64')
+        codes = provenance(df,sources)
+
+        meta = {
+            'fetched': datetime.now().strftime(TIMESTAMP_FORMAT),
+            'sources': list(names),
+            'shape': list(df.shape),
+        }
+
+        with self._lock:
+            # write to temporary files first, so that other processes never read half written files
+            suffix = '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+            path = self._path(symbol,'.npz')
+            with open(path + suffix,'wb') as f:
+                np.savez_compressed(f, values=values, provenance=codes,
+                    rows=np.array(df.index.astype(str), dtype=str), columns=np.array(df.columns.astype(str), dtype=str))
+            os.replace(path + suffix, path)
+
+            path = self._path(symbol,'.json')
+            with open(path + suffix,'w') as f:
+                json.dump(meta,f)
+            os.replace(path + suffix, path)
+
+
+
+_statementsStore = None
+
+def getStatementsStore():
+    global _statementsStore
+    if _statementsStore is None:
+        _statementsStore = StatementsStore(getCacheFolder('statements'))
+    return _statementsStore
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+
+def alignPrices(prices):
+    """
+        Aligns multiple price series on the union of their dates
+        - prices: dict (name -> pandas.Series), list of Series or DataFrame (one column per series)
+        Missing prices (e.g. because of different trading days of the exchanges) are filled
+        with the last known price.
+    """
+    if isinstance(prices,DataFrame):
+        df = prices
+    elif isinstance(prices,dict):
+        df = pd.concat(list(prices.values()), axis=1, keys=list(prices.keys()))
+    else:
+        df = pd.concat(list(prices), axis=1)
+
+    return df.sort_index().ffill()
+
+
+def rebasePrices(prices,startDate=None,base=100):
+    """
+        Rebases price series to a common start date, so that all of them start with the value of "base".
+        - prices: pandas.Series, DataFrame (one column per series), dict or list of Series
+        - startDate: first date of the rebased series (str, datetime or datetime64). If it is None,
+          the first date, for which all series have a price, is used.
+        A Series is returned for a Series, otherwise a DataFrame with one column per series.
+    """
+    isSeries = isinstance(prices,Series)
+    if isSeries:
+        df = prices.to_frame()
+    else:
+        df = alignPrices(prices)
+
+    if startDate is not None:
+        start = pd.Timestamp(startDate)
+        if (df.index.tz is not None) and (start.tz is None):
+            start = start.tz_localize(df.index.tz)
+        df = df.loc[df.index >= start]
+
+    # first date, for which all series have a price
+    complete = np.flatnonzero(df.notna().all(axis=1).values)
+    if len(complete) == 0:
+        rebased = df*np.nan
+    else:
+        df = df.iloc[complete[0]:]
+        rebased = df/df.iloc[0].values*base
+
+    if isSeries:
+        return rebased.iloc[:,0].rename(prices.name)
+    return rebased
@@ -0,0 +1,83 @@
+import numpy as np
+
+# linear trends y = slope*x + intercept
+#
+# The values y can be one series (shape (n,)) or many series with the same x values
+# (shape (..., n)), which are fitted at once. The fit is done in closed form with NumPy.
+
+LEAST_SQUARES = 'least-squares'
+THEIL_SEN = 'theil-sen'
+
+
+def fitLeastSquares(x,y):
+    # slope and intercept of the ordinary least squares fit
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    dx = x - x.mean()
+    yMean = y.mean(axis=-1)
+    slope = (dx*(y - yMean[...,np.newaxis])).sum(axis=-1)/(dx*dx).sum()
+    intercept = yMean - slope*x.mean()
+    return slope, intercept
+
+
+def fitTheilSen(x,y):
+    """
+        slope and intercept of the Theil-Sen estimator: the slope is the median of the slopes between
+        all pairs of points and the intercept the median of y - slope*x. A few outliers (e.g. a single
+        year with a very high or low cash flow) have almost no influence on the trend.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    # all pairs of points with different x values
+    i, j = np.triu_indices(len(x), k=1)
+    different = x[j] != x[i]
+    i, j = i[different], j[different]
+
+    slope = np.median((y[...,j] - y[...,i])/(x[j] - x[i]), axis=-1)
+    intercept = np.median(y - slope[...,np.newaxis]*x, axis=-1)
+    return slope, intercept
+
+
+class LinearTrend():
+    """
+        Linear trend of one or many series
+        - slope, intercept: scalars or arrays (one value per series)
+    """
+
+    METHODS = {LEAST_SQUARES: fitLeastSquares, THEIL_SEN: fitTheilSen}
+
+    def __init__(self,slope,intercept):
+        self.slope = slope
+        self.intercept = intercept
+
+
+    @classmethod
+    def fit(cls,x,y,method=LEAST_SQUARES):
+        """
+            - x: array of n values
+            - y: array of shape (n,) or (..., n)
+            - method: 'least-squares' or 'theil-sen'
+        """
+        if method not in cls.METHODS:
+            raise ValueError('The method "' + str(method) + '" is not supported. Supported methods: ' + ', '.join(cls.METHODS))
+        return cls(*cls.METHODS[method](x,y))
+
+
+    def predict(self,x):
+        # values of the trend for x (scalar or array); for many series the result has the shape (..., len(x))
+        x = np.asarray(x, dtype='float64')
+        slope = np.asarray(self.slope)
+        intercept = np.asarray(self.intercept)
+        if x.ndim == 0:
+            return slope*x + intercept
+        return slope[...,np.newaxis]*x + intercept[...,np.newaxis]
+
+
+    def score(self,x,y):
+        # coefficient of determination R^2
+        y = np.asarray(y, dtype='float64')
+        residuals = ((y - self.predict(x))**2).sum(axis=-1)
+        total = ((y - y.mean(axis=-1)[...,np.newaxis])**2).sum(axis=-1)
+        return 1 - residuals/total
@@ -1,115 +1,205 @@
 # extensions for the module "yfinance", because it does not have the ability to load all necessary data
 
 # import modules
-import requests as _requests
+import re as _re
 import json as _json
 import collections
-from pandas import DataFrame
+import numpy as np
+from pandas import DataFrame, Series
 from datetime import datetime
 
+from utils.http_cache import cachedFetch
+from utils.http_session import getTransport
+from utils.singleflight import SingleFlight
+
+
+# marker in the html page, which is followed by the JSON object with all data stores
+APP_MAIN_MARKER = b'root.App.main ='
+
+# size of the chunks, which are read from the response
+CHUNK_SIZE = 64*1024
+
+# characters, which are relevant to find the end of the JSON object
+_OBJECT_TOKENS = _re.compile(rb'["{}]')
+_STRING_TOKENS = _re.compile(rb'["\\]')
+
+# every page is loaded and decoded only once, also if it is requested by several threads
+# the decoded pages are kept until they are released with releasePageStores (several MB per symbol)
+_pageStores = SingleFlight(keepResults=True)
+
+
+# Function to extract the JSON object after the marker "root.App.main =" from chunks of bytes
+# The chunks are read only until the JSON object is complete, the rest of the page is never read.
+# The bytes of the JSON object are returned. If the page contains no JSON object, None is returned.
+def extractAppMainJson(chunks):
+    buffer = bytearray()
+    start = -1
+    pos = 0
+    depth = 0
+    inString = False
+
+    for chunk in chunks:
+        buffer += chunk
+
+        # search the marker and the opening brace of the JSON object
+        if start < 0:
+            markerPos = buffer.find(APP_MAIN_MARKER)
+            if markerPos < 0:
+                # keep only the end of the buffer, which could contain the beginning of the marker
+                del buffer[:max(0,len(buffer)-len(APP_MAIN_MARKER))]
+                continue
+            start = buffer.find(b'{', markerPos+len(APP_MAIN_MARKER))
+            if start < 0:
+                continue
+            del buffer[:start]
+            start, pos = 0, 0
+
+        # jump from token to token, until the closing brace of the object is found
+        while True:
+            if inString:
+                match = _STRING_TOKENS.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if buffer[match.start()] == ord('\\'):
+                    # skip the escaped character, it might be in the next chunk
+                    if match.start()+1 >= len(buffer):
+                        pos = match.start()
+                        break
+                    pos = match.start()+2
+                else:
+                    inString = False
+                    pos = match.end()
+            else:
+                match = _OBJECT_TOKENS.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                token = buffer[match.start()]
+                pos = match.end()
+                if token == ord('"'):
+                    inString = True
+                elif token == ord('{'):
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return bytes(buffer[:pos])
+
+    return None
+
+
+# Function to load the JSON object with the data stores from a page of yahoo finance
+# The response is streamed and closed as soon as the JSON object is complete.
+def _streamAppMainJson(url):
+    with getTransport().stream(url) as r:
+        if not r.ok:
+            return None
+        return extractAppMainJson(r.iter_content(CHUNK_SIZE))
+
+
+# Function to load the data stores, which are embedded in the page as "root.App.main = {...}"
+# Only the JSON object is cached, not the whole page. It is decoded only once per page
+# and all series are extracted from the returned dict.
+def loadPageStores(url,endpoint):
+    def load():
+        content = cachedFetch(url + '#root.App.main', endpoint, lambda: _streamAppMainJson(url))
+        if content is None:
+            return None
+        return _json.loads(content)['context']['dispatcher']['stores']
+
+    stores = _pageStores.do(url, load)
+    if stores is None:
+        return {}
+    return stores
+
+
+# Function to release the decoded pages of a symbol, after all data was extracted
+def releasePageStores(symbol):
+    prefix = "https://finance.yahoo.com/quote/" + symbol + "/"
+    _pageStores.forgetIf(lambda url: url.startswith(prefix))
+
+
+# Function to extract multiple time series from the QuoteTimeSeriesStore in one pass
+# For every key a tuple with the dates (datetime64[D]) and the values (float64) is returned,
+# both sorted in descending order, from newest to oldest.
+def extractTimeSeries(stores,keys):
+    timeSeries = {}
+    if 'QuoteTimeSeriesStore' in stores:
+        timeSeries = stores['QuoteTimeSeriesStore']['timeSeries']
+
+    series = {}
+    for key in keys:
+        entries = [e for e in timeSeries.get(key,[]) if e is not None]
+
+        dates = np.array([e['asOfDate'] for e in entries], dtype='datetime64[D]')
+        values = np.array([e['reportedValue']['raw'] for e in entries], dtype=np.float64)
+
+        order = np.argsort(dates)[::-1]
+        series[key] = (dates[order], values[order])
+
+    return series
+
+
+# Function to create a DataFrame from the extracted time series
+# - rowNames: dict, which maps the key of the time series to the name of the row in the DataFrame
+def timeSeriesToDataFrame(series,rowNames):
+    rows = {}
+    for key, rowName in rowNames.items():
+        dates, values = series[key]
+        if len(dates) > 0:
+            rows[rowName] = Series(values, index=np.datetime_as_string(dates, unit='D'))
+
+    if len(rows) == 0:
+        return DataFrame()
+
+    df = DataFrame(rows).T
+
+    # columns in descending order, from newest to oldest
+    return df.reindex(sorted(df.columns, reverse=True), axis=1)
+
 
 # Function to get the annualDilutedEPS from yahoo finance
 def loadExtraIncomeStatementData(symbol):
 
     url = "https://finance.yahoo.com/quote/" + symbol + "/financials"
 
-    dilutedEpsDict = {}
-    basicEpsDict = {}
-    averageDilutedSharesDict = {}
-    averageBasicSharesDict = {}
-    html = _requests.get(url=url).text
-
-    json_str = html.split('root.App.main =')[1].split(
-        '(this)')[0].split(';\n}')[0].strip()
-    
-    if "QuoteTimeSeries" in html:
-        annualDilutedEPSList = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteTimeSeriesStore']['timeSeries']['annualDilutedEPS']
-
-        for eps in annualDilutedEPSList:
-            if eps is not None:
-                dilutedEpsDict[eps['asOfDate']] = eps['reportedValue']['raw']
-
-        annualBasicEPSList = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteTimeSeriesStore']['timeSeries']['annualBasicEPS']
-        for eps in annualBasicEPSList:
-            if eps is not None:
-                basicEpsDict[eps['asOfDate']] = eps['reportedValue']['raw']
-
-        annualDilutedAverageSharesList = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteTimeSeriesStore']['timeSeries']['annualDilutedAverageShares']
-        for avgShares in annualDilutedAverageSharesList:
-            if avgShares is not None:
-                averageDilutedSharesDict[avgShares['asOfDate']] = avgShares['reportedValue']['raw']
-
-        annualBasicAverageSharesList = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteTimeSeriesStore']['timeSeries']['annualBasicAverageShares']
-        for avgShares in annualBasicAverageSharesList:
-            if avgShares is not None:
-                averageBasicSharesDict[avgShares['asOfDate']] = avgShares['reportedValue']['raw']
-
-
-    # sort dicts in descending order, from newest to oldest
-    dilutedEpsDictSorted = sortDictDescending(dilutedEpsDict)
-    basicEpsDictSorted = sortDictDescending(basicEpsDict)
-
-    # create an empty pandas data frame
-    df = DataFrame()
-
-    # add diluted eps data
-    for k,v in dilutedEpsDictSorted.items():
-        df.loc['dilutedEPS', k] = v
-
-    # add basic EPS data
-    for k,v in basicEpsDictSorted.items():
-        df.loc['basicEPS',k] = v
+    rowNames = {
+        'annualDilutedEPS': 'dilutedEPS',
+        'annualBasicEPS': 'basicEPS',
+        'annualDilutedAverageShares': 'dilutedAverageShares',
+        'annualBasicAverageShares': 'basicAverageShares'
+    }
 
-    # add diluted average shares
-    for k,v in averageDilutedSharesDict.items():
-        df.loc['dilutedAverageShares',k] = v
+    stores = loadPageStores(url,'financials')
+    series = extractTimeSeries(stores,rowNames.keys())
 
-    # add basic average shares
-    for k,v in averageBasicSharesDict.items():
-        df.loc['basicAverageShares',k] = v
-    
-    return df
+    return timeSeriesToDataFrame(series,rowNames)
 
 def load_CashFlow(symbol):
     url = "https://finance.yahoo.com/quote/" + symbol + "/cash-flow?p=" + symbol
 
-    freecashflowDict = {}
-    html = _requests.get(url=url).text
-
-    json_str = html.split('root.App.main =')[1].split(
-        '(this)')[0].split(';\n}')[0].strip()
-    
-    if "QuoteTimeSeries" in html:
-        freeCashFlowList = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteTimeSeriesStore']['timeSeries']['annualFreeCashFlow']
-
-        for freecashflow in freeCashFlowList:
-            if freecashflow is not None:
-                freecashflowDict[freecashflow['asOfDate']] = freecashflow['reportedValue']['raw']
-
-    # sort dicts in descending order, from newest to oldest
-    freecasflowDictSorted = sortDictDescending(freecashflowDict)
-
-    # create an empty pandas data frame
-    df = DataFrame()
+    rowNames = {
+        'annualFreeCashFlow': 'freeCashFlow'
+    }
 
-    # add diluted eps data
-    for k,v in freecasflowDictSorted.items():
-        df.loc['freeCashFlow', k] = v
+    stores = loadPageStores(url,'cash-flow')
+    series = extractTimeSeries(stores,rowNames.keys())
 
-    return df
+    return timeSeriesToDataFrame(series,rowNames)
 
 def load_KeyStatistics(symbol):
     url = "https://finance.yahoo.com/quote/" + symbol + "/key-statistics?p=" + symbol
 
     sharesOutstanding = None
-    html = _requests.get(url=url).text
+    marketCap = None
+
+    stores = loadPageStores(url,'key-statistics')
 
-    json_str = html.split('root.App.main =')[1].split(
-        '(this)')[0].split(';\n}')[0].strip()
-    
-    if "QuoteSummaryStore" in html:
-        sharesOutstanding = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteSummaryStore']['defaultKeyStatistics']['sharesOutstanding']['raw']
-        marketCap = _json.loads(json_str)['context']['dispatcher']['stores']['QuoteSummaryStore']['price']['marketCap']['raw']
+    if "QuoteSummaryStore" in stores:
+        quoteSummary = stores['QuoteSummaryStore']
+        sharesOutstanding = quoteSummary['defaultKeyStatistics']['sharesOutstanding']['raw']
+        marketCap = quoteSummary['price']['marketCap']['raw']
 
     # create an empty pandas data frame
     keyStatisticDict =	{
@@ -119,4 +209,4 @@ def load_KeyStatistics(symbol):
     return keyStatisticDict
 
 def sortDictDescending(dictionary):
-    return dict(reversed(sorted(dictionary.items())))
\ No newline at end of file
+    return dict(reversed(sorted(dictionary.items())))